@@ -0,0 +1,29 @@
+"""Add schedule MD5 tracking for incremental ingest
+
+Revision ID: 002
+Revises: 001
+Create Date: 2025-10-12 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Create schedule_md5s table
+    op.create_table('schedule_md5s',
+        sa.Column('station_id', sa.String(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('md5', sa.String(), nullable=False),
+        sa.Column('last_modified', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('station_id', 'date')
+    )
+
+def downgrade() -> None:
+    op.drop_table('schedule_md5s')
@@ -0,0 +1,21 @@
+"""Store encrypted SD password hash for automatic re-authentication
+
+Revision ID: 003
+Revises: 002
+Create Date: 2025-10-14 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('sd_accounts', sa.Column('sd_password_hash', sa.Text(), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('sd_accounts', 'sd_password_hash')
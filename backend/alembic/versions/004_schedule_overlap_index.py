@@ -0,0 +1,25 @@
+"""Add GiST overlap index for guide grid queries
+
+Revision ID: 004
+Revises: 003
+Create Date: 2025-10-16 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # btree_gist lets station_id (a plain equality key) share a GiST index with the airing range
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    op.execute(
+        "CREATE INDEX ix_schedules_station_airing ON schedules "
+        "USING gist (station_id, tstzrange(start_utc, end_utc, '[)'))"
+    )
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_schedules_station_airing")
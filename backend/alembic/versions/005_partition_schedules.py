@@ -0,0 +1,99 @@
+"""Partition schedules by day on start_utc
+
+Revision ID: 005
+Revises: 004
+Create Date: 2025-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+# Creates one partition per UTC day from the first existing airing through two weeks ahead
+CREATE_PARTITIONS = """
+DO $$
+DECLARE
+    day date;
+    last_day date;
+BEGIN
+    SELECT COALESCE(min(start_utc AT TIME ZONE 'UTC')::date, current_date),
+           GREATEST(COALESCE(max(start_utc AT TIME ZONE 'UTC')::date, current_date), current_date + 14)
+      INTO day, last_day
+      FROM schedules_unpartitioned;
+
+    WHILE day <= last_day LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF schedules FOR VALUES FROM (%L) TO (%L)',
+            'schedules_p' || to_char(day, 'YYYYMMDD'),
+            day::text || ' 00:00:00+00',
+            (day + 1)::text || ' 00:00:00+00'
+        );
+        day := day + 1;
+    END LOOP;
+END
+$$
+"""
+
+COLUMNS = (
+    "station_id, program_id, start_utc, end_utc, is_new, live, premiere, finale, "
+    "audio, aspect, subtitles, created_at"
+)
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE schedules RENAME TO schedules_unpartitioned")
+    op.execute("ALTER TABLE schedules_unpartitioned RENAME CONSTRAINT schedules_pkey TO schedules_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_schedules_start_utc RENAME TO ix_schedules_unpartitioned_start_utc")
+    op.execute("ALTER INDEX ix_schedules_end_utc RENAME TO ix_schedules_unpartitioned_end_utc")
+    op.execute("DROP INDEX IF EXISTS ix_schedules_station_airing")
+
+    # The partition key must be part of the primary key, which start_utc already is
+    op.execute(
+        "CREATE TABLE schedules ("
+        "station_id varchar NOT NULL, "
+        "program_id varchar NOT NULL, "
+        "start_utc timestamptz NOT NULL, "
+        "end_utc timestamptz NOT NULL, "
+        "is_new boolean, "
+        "live boolean, "
+        "premiere boolean, "
+        "finale boolean, "
+        "audio varchar, "
+        "aspect varchar, "
+        "subtitles varchar[], "
+        "created_at timestamptz, "
+        "CONSTRAINT schedules_pkey PRIMARY KEY (station_id, program_id, start_utc)"
+        ") PARTITION BY RANGE (start_utc)"
+    )
+    op.execute("CREATE INDEX ix_schedules_start_utc ON schedules (start_utc)")
+    op.execute("CREATE INDEX ix_schedules_end_utc ON schedules (end_utc)")
+    op.execute(
+        "CREATE INDEX ix_schedules_station_airing ON schedules "
+        "USING gist (station_id, tstzrange(start_utc, end_utc, '[)'))"
+    )
+
+    op.execute(CREATE_PARTITIONS)
+    op.execute(f"INSERT INTO schedules ({COLUMNS}) SELECT {COLUMNS} FROM schedules_unpartitioned")
+    op.execute("DROP TABLE schedules_unpartitioned")
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE schedules RENAME TO schedules_partitioned")
+    op.execute("ALTER TABLE schedules_partitioned RENAME CONSTRAINT schedules_pkey TO schedules_partitioned_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_schedules_start_utc")
+    op.execute("DROP INDEX IF EXISTS ix_schedules_end_utc")
+    op.execute("DROP INDEX IF EXISTS ix_schedules_station_airing")
+
+    op.execute("CREATE TABLE schedules (LIKE schedules_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER TABLE schedules ADD CONSTRAINT schedules_pkey PRIMARY KEY (station_id, program_id, start_utc)")
+    op.execute(f"INSERT INTO schedules ({COLUMNS}) SELECT {COLUMNS} FROM schedules_partitioned")
+    op.execute("DROP TABLE schedules_partitioned")
+
+    op.execute("CREATE INDEX ix_schedules_start_utc ON schedules (start_utc)")
+    op.execute("CREATE INDEX ix_schedules_end_utc ON schedules (end_utc)")
+    op.execute(
+        "CREATE INDEX ix_schedules_station_airing ON schedules "
+        "USING gist (station_id, tstzrange(start_utc, end_utc, '[)'))"
+    )
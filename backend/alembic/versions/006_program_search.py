@@ -0,0 +1,49 @@
+"""Add full-text and trigram search indexes for programs
+
+Revision ID: 006
+Revises: 005
+Create Date: 2025-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.add_column('programs', sa.Column('people', sa.Text(), nullable=True))
+    op.execute(
+        "UPDATE programs SET people = NULLIF(concat_ws(' ', "
+        "(SELECT string_agg(p->>'name', ' ') FROM json_array_elements(COALESCE(\"cast\", '[]'::json)) p), "
+        "(SELECT string_agg(p->>'name', ' ') FROM json_array_elements(COALESCE(crew, '[]'::json)) p)"
+        "), '')"
+    )
+
+    # Stored generated column: Postgres keeps it current on every insert/update
+    op.execute(
+        "ALTER TABLE programs ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(episode_title, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(people, '')), 'C') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'D')"
+        ") STORED"
+    )
+
+    op.execute("CREATE INDEX ix_programs_search_vector ON programs USING gin (search_vector)")
+    op.execute("CREATE INDEX ix_programs_title_trgm ON programs USING gin (title gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_programs_genres ON programs USING gin (genres)")
+    op.create_index('ix_schedules_program_start', 'schedules', ['program_id', 'start_utc'])
+
+def downgrade() -> None:
+    op.drop_index('ix_schedules_program_start', table_name='schedules')
+    op.execute("DROP INDEX IF EXISTS ix_programs_genres")
+    op.execute("DROP INDEX IF EXISTS ix_programs_title_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_programs_search_vector")
+    op.drop_column('programs', 'search_vector')
+    op.drop_column('programs', 'people')
@@ -0,0 +1,44 @@
+"""Add notification idempotency keys and a pending-dispatch index
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('notifications', sa.Column('idempotency_key', sa.String(), nullable=True))
+
+    # Same format as app.services.notifications.idempotency_key
+    op.execute(
+        "UPDATE notifications SET idempotency_key = md5("
+        "coalesce(user_id::text, '') || '|' || coalesce(rule_id::text, '') || '|' || "
+        "coalesce(station_id, '') || '|' || coalesce(program_id, '') || '|' || "
+        "coalesce(extract(epoch FROM start_utc)::bigint::text, ''))"
+    )
+    # Keep the oldest row per key; ctid breaks ties so equal or NULL timestamps still leave exactly one
+    op.execute(
+        "DELETE FROM notifications WHERE ctid IN ("
+        "SELECT ctid FROM (SELECT ctid, row_number() OVER ("
+        "PARTITION BY idempotency_key ORDER BY created_at NULLS LAST, ctid) AS rn "
+        "FROM notifications) d WHERE d.rn > 1)"
+    )
+
+    op.create_index('ix_notifications_idempotency_key', 'notifications', ['idempotency_key'], unique=True)
+    op.create_index(
+        'ix_notifications_pending', 'notifications', ['created_at'],
+        postgresql_where=sa.text("status = 'pending'")
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_pending', table_name='notifications')
+    op.drop_index('ix_notifications_idempotency_key', table_name='notifications')
+    op.drop_column('notifications', 'idempotency_key')
@@ -0,0 +1,23 @@
+"""Track notification delivery attempts for bounded retries
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column('notifications', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('notifications', sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+
+def downgrade() -> None:
+    op.drop_column('notifications', 'next_attempt_at')
+    op.drop_column('notifications', 'attempts')
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+from app.services.versions import get_versions, get_user_version_keys
+
+logger = logging.getLogger(__name__)
+
+class Validators:
+    """ETag and Last-Modified for a response, derived from content version counters"""
+
+    def __init__(self, etag: str, last_modified: Optional[datetime], vary: Optional[str] = None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.vary = vary
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        # Clients may keep the response but must revalidate before reusing it
+        headers = {"ETag": self.etag, "Cache-Control": "private, no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        # Sent on 304s too, so caches key the revalidated copy the same way as the original
+        if self.vary:
+            headers["Vary"] = self.vary
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """Check whether the client's cached copy is still current"""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # Weak comparison (RFC 9110 13.1.2): a W/ prefix on either side is ignored
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or _opaque(self.etag) in {_opaque(tag) for tag in tags}
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified is not None:
+            try:
+                return self.last_modified <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+async def get_validators(
+    request: Request,
+    version_keys: List[str],
+    variant: str = "",
+    vary: Optional[str] = None
+) -> Optional[Validators]:
+    """Get validators for a request from the versions of the data it reads.
+
+    The request's path and query (plus any representation variant, such as
+    gzip) are folded into the ETag, so each distinct response gets its own
+    strong tag. `vary` names the request headers the response depends on.
+    Returns None if the version store is unavailable.
+    """
+    try:
+        version, last_modified = await get_versions(version_keys)
+    except Exception as e:
+        logger.warning(f"Content versions unavailable: {e}")
+        return None
+
+    digest = hashlib.sha1(f"{version}|{request.url.path}?{request.url.query}|{variant}".encode()).hexdigest()
+    return Validators(f'"{digest}"', last_modified, vary)
+
+async def get_user_validators(
+    request: Request,
+    user_id: str,
+    load_lineup_ids: Callable[[], Awaitable[List[str]]],
+    version_keys: Optional[List[str]] = None,
+    variant: str = "",
+    vary: Optional[str] = None
+) -> Optional[Validators]:
+    """Get validators for a per-user view that also reads the user's lineups"""
+    try:
+        user_keys = await get_user_version_keys(user_id, load_lineup_ids)
+    except Exception as e:
+        logger.warning(f"Content versions unavailable: {e}")
+        return None
+    return await get_validators(request, (version_keys or []) + user_keys, variant=variant, vary=vary)
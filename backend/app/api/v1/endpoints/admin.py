@@ -1,19 +1,25 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
+from app.api.deps import get_current_user
 from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
 from app.models.core import User
+from app.services.ingest_runs import get_ingest_progress
 
 router = APIRouter()
 
 @router.get("/jobs")
 async def get_jobs(
+    limit: int = Query(5, ge=1, le=20),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get background job status"""
-    return {"message": "Admin jobs endpoint - implementation needed"}
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    # Recent full refreshes with per-shard progress, rows/sec and ETA
+    return {"ingest_runs": await get_ingest_progress(limit)}
 
 @router.get("/health")
 async def admin_health():
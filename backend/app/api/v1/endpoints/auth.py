@@ -1,14 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timedelta
 from typing import Optional
 
-from app.core.database import get_db
+from app.api.deps import get_current_user
+from app.core.database import get_db, get_async_db
 from app.core.security import verify_password, hash_password, create_access_token, create_refresh_token, verify_token
 from app.models.core import User
 from app.schemas.auth import UserCreate, UserResponse, Token, LoginRequest
+from app.services.user_cache import get_user
 
 router = APIRouter()
 security = HTTPBearer()
@@ -81,7 +84,7 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
     )
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
     """Refresh access token"""
     try:
         payload = verify_token(credentials.credentials)
@@ -90,7 +93,7 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(secu
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
         
         # Verify user exists and is active
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await get_user(db, user_id)
         if not user or not user.is_active:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
         
@@ -105,22 +108,6 @@ async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(secu
         )
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def read_current_user(current_user: User = Depends(get_current_user)):
     """Get current user information"""
-    try:
-        payload = verify_token(credentials.credentials)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user or not user.is_active:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        
-        return UserResponse.from_orm(user)
-        
-    except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
-        )
\ No newline at end of file
+    return UserResponse.from_orm(current_user)
@@ -1,19 +1,50 @@
-from fastapi import APIRouter, Depends, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, time, timedelta, timezone
 
-from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
+from app.api.conditional import get_user_validators
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.database import get_async_db
 from app.models.core import User
+from app.services.ical import get_user_lineup_ids, ical_cache_key, get_cached_feed, stream_ical_feed
 
 router = APIRouter()
 
 @router.get("/ical")
 async def get_ical_feed(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get iCal feed for user's calendar"""
-    return Response(
-        content="BEGIN:VCALENDAR\nVERSION:2.0\nEND:VCALENDAR",
-        media_type="text/calendar"
+    user_id = str(current_user.id)
+    today = datetime.now(timezone.utc).date()
+
+    # The feed reads the user's favourites and rule matches, and airings on their lineups,
+    # all versioned in Redis; the day is part of the variant because the feed's window moves with it
+    validators = await get_user_validators(
+        request,
+        user_id,
+        lambda: get_user_lineup_ids(db, user_id),
+        variant=f"{user_id}|{today.isoformat()}",
+        vary="Authorization"
+    )
+    if validators and validators.matches(request):
+        return validators.not_modified()
+
+    headers = validators.headers if validators else {}
+    cache_key = ical_cache_key(user_id, validators.etag.strip('"')) if validators else None
+    if cache_key:
+        cached = await get_cached_feed(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="text/calendar", headers=headers)
+
+    start = datetime.combine(today, time.min, tzinfo=timezone.utc)
+    end = start + timedelta(days=settings.ICAL_FEED_DAYS)
+    return StreamingResponse(
+        stream_ical_feed(user_id, start, end, cache_key),
+        media_type="text/calendar",
+        headers=headers
     )
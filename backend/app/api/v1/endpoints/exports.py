@@ -1,16 +1,40 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 
-from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
+from app.api.deps import get_current_user
+from app.core.database import get_async_db
 from app.models.core import User
+from app.services.xmltv import get_export_channels, stream_xmltv
 
 router = APIRouter()
 
+class XMLTVExportRequest(BaseModel):
+    station_ids: Optional[List[str]] = None  # Defaults to every station in the user's lineups
+    days: int = Field(14, ge=1, le=21)
+    gzip: bool = False
+
 @router.post("/xmltv")
 async def export_xmltv(
+    request: XMLTVExportRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Export XMLTV for selected channels"""
-    return {"message": "XMLTV export endpoint - implementation needed"}
+    channels = await get_export_channels(db, str(current_user.id), request.station_ids)
+    if not channels:
+        raise HTTPException(status_code=404, detail="No matching stations in your lineups")
+
+    today = datetime.now(timezone.utc).date()
+    days = [today + timedelta(days=offset) for offset in range(request.days)]
+
+    # Assembled from precomputed per station-day fragments as it streams
+    filename = "xmltv.xml.gz" if request.gzip else "xmltv.xml"
+    return StreamingResponse(
+        stream_xmltv(channels, days, compress=request.gzip),
+        media_type="application/gzip" if request.gzip else "application/xml",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 
+from app.api.deps import get_current_user
 from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
 from app.models.core import User
 
 router = APIRouter()
@@ -1,34 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta
 
-from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
-from app.models.core import User, Schedule, Program, Station, LineupStation
+from app.api.conditional import get_validators
+from app.api.deps import get_current_user
+from app.core.database import get_async_db
+from app.models.core import User
+from app.services.guide import build_grid, as_utc
+from app.services.guide_tiles import get_grid_payload
+from app.services.versions import lineup_version_key, station_version_key
 
 router = APIRouter()
 
+# Largest window a single grid request may cover
+MAX_GRID_WINDOW = timedelta(hours=24)
+
+def validate_window(start_time: datetime, end_time: datetime):
+    """Reject empty or oversized time windows"""
+    start_time, end_time = as_utc(start_time), as_utc(end_time)
+    if end_time <= start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    if end_time - start_time > MAX_GRID_WINDOW:
+        raise HTTPException(status_code=400, detail="Time window cannot exceed 24 hours")
+
 @router.get("/grid")
 async def get_guide_grid(
+    request: Request,
     lineup_id: str,
     start_time: datetime = Query(..., description="Start time in UTC"),
     end_time: datetime = Query(..., description="End time in UTC"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get EPG grid data for a specific time window"""
-    # TODO: Implement guide grid logic
-    return {"message": "Guide grid endpoint - implementation needed"}
+    validate_window(start_time, end_time)
+    accept_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    
+    # Answered from the lineup's version counter alone when the client is current
+    validators = await get_validators(
+        request, [lineup_version_key(lineup_id)], variant="gzip" if accept_gzip else "", vary="Accept-Encoding"
+    )
+    if validators and validators.matches(request):
+        return validators.not_modified()
+    
+    # Assembled from pre-serialized tiles; Postgres is only queried for missing tiles
+    body, gzipped = await get_grid_payload(db, lineup_id, start_time, end_time, accept_gzip)
+    
+    headers = {"Vary": "Accept-Encoding"}
+    if validators:
+        headers.update(validators.headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/channel/{station_id}")
 async def get_channel_schedule(
+    request: Request,
     station_id: str,
     start_time: datetime = Query(..., description="Start time in UTC"),
     end_time: datetime = Query(..., description="End time in UTC"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get schedule for a single channel"""
-    # TODO: Implement channel schedule logic
-    return {"message": "Channel schedule endpoint - implementation needed"}
\ No newline at end of file
+    validate_window(start_time, end_time)
+    
+    validators = await get_validators(request, [station_version_key(station_id)])
+    if validators and validators.matches(request):
+        return validators.not_modified()
+    
+    grid = await build_grid(db, start_time, end_time, station_id=station_id)
+    if not grid["stations"]:
+        raise HTTPException(status_code=404, detail="Station not found")
+    return JSONResponse(grid, headers=validators.headers if validators else None)
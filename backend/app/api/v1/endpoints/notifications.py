@@ -1,16 +1,37 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
-from app.models.core import User
+from app.api.deps import get_current_user
+from app.core.database import get_async_db
+from app.models.core import User, Program
+from app.models.user_data import Notification
 
 router = APIRouter()
 
 @router.get("/")
 async def get_notifications(
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user notifications"""
-    return {"message": "Get notifications endpoint - implementation needed"}
+    result = await db.execute(
+        select(Notification, Program.title)
+        .outerjoin(Program, Program.program_id == Notification.program_id)
+        .where(Notification.user_id == current_user.id, Notification.status == "sent")
+        .order_by(Notification.start_utc.desc())
+        .limit(limit)
+    )
+    return [
+        {
+            "id": str(notification.id),
+            "rule_id": str(notification.rule_id) if notification.rule_id else None,
+            "station_id": notification.station_id,
+            "program_id": notification.program_id,
+            "title": title,
+            "start_utc": notification.start_utc.isoformat() if notification.start_utc else None,
+            "status": notification.status,
+        }
+        for notification, title in result
+    ]
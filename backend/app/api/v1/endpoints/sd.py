@@ -1,17 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional
 
-from app.core.database import get_db
-from app.core.security import verify_token, encrypt_data, decrypt_data
-from app.models.core import User, SchedulesDirectAccount, Lineup, UserLineup
-from app.services.schedules_direct import SchedulesDirectClient
+from app.api.deps import get_current_user
 from app.core.config import settings
+from app.core.database import get_db, get_async_db
+from app.core.security import encrypt_data
+from app.models.core import User, SchedulesDirectAccount, Lineup, UserLineup
+from app.services.schedules_direct import SchedulesDirectClient, get_sd_client, hash_sd_password
+from app.services.sd_tokens import token_manager
+from app.services.versions import user_lineups_changed
 
 router = APIRouter()
-security = HTTPBearer()
 
 class SDConnectRequest(BaseModel):
     sd_username: str
@@ -28,36 +31,23 @@ class SDConnectionResponse(BaseModel):
     username: Optional[str] = None
     last_success: Optional[str] = None
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)) -> User:
-    """Get current authenticated user"""
-    try:
-        payload = verify_token(credentials.credentials)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user or not user.is_active:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        
-        return user
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
 @router.post("/connect", response_model=SDConnectionResponse)
 async def connect_sd_account(
     request: SDConnectRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    sd_client: SchedulesDirectClient = Depends(get_sd_client)
 ):
     """Connect user's Schedules Direct account"""
     try:
-        # Initialize SD client and authenticate
-        sd_client = SchedulesDirectClient(settings.SD_API_BASE)
+        # Authenticate using the shared SD client
         token_data = await sd_client.authenticate(request.sd_username, request.sd_password)
         
-        # Encrypt and store the token
+        # Encrypt and store the token, plus (if enabled) the password hash for automatic re-auth
         encrypted_token = encrypt_data(token_data["token"])
+        encrypted_password_hash = (
+            encrypt_data(hash_sd_password(request.sd_password)) if settings.SD_STORE_PASSWORD_HASH else None
+        )
         
         # Check if account already exists
         sd_account = db.query(SchedulesDirectAccount).filter(
@@ -68,6 +58,7 @@ async def connect_sd_account(
             # Update existing account
             sd_account.sd_username = request.sd_username
             sd_account.sd_token = encrypted_token
+            sd_account.sd_password_hash = encrypted_password_hash
             sd_account.token_expires_at = token_data.get("expires_at")
         else:
             # Create new account
@@ -75,11 +66,13 @@ async def connect_sd_account(
                 user_id=current_user.id,
                 sd_username=request.sd_username,
                 sd_token=encrypted_token,
+                sd_password_hash=encrypted_password_hash,
                 token_expires_at=token_data.get("expires_at")
             )
             db.add(sd_account)
         
         db.commit()
+        await token_manager.remember(str(current_user.id), encrypted_token, token_data["expires_at"])
         
         return SDConnectionResponse(
             connected=True,
@@ -95,12 +88,12 @@ async def connect_sd_account(
 @router.get("/status", response_model=SDConnectionResponse)
 async def get_sd_status(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get Schedules Direct connection status"""
-    sd_account = db.query(SchedulesDirectAccount).filter(
-        SchedulesDirectAccount.user_id == current_user.id
-    ).first()
+    sd_account = await db.scalar(
+        select(SchedulesDirectAccount).where(SchedulesDirectAccount.user_id == current_user.id)
+    )
     
     if not sd_account:
         return SDConnectionResponse(connected=False)
@@ -114,7 +107,8 @@ async def get_sd_status(
 @router.get("/lineups", response_model=List[LineupResponse])
 async def get_available_lineups(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    sd_client: SchedulesDirectClient = Depends(get_sd_client)
 ):
     """Get available lineups for the user's SD account"""
     sd_account = db.query(SchedulesDirectAccount).filter(
@@ -128,9 +122,8 @@ async def get_available_lineups(
         )
     
     try:
-        # Decrypt token and get lineups
-        token = decrypt_data(sd_account.sd_token)
-        sd_client = SchedulesDirectClient(settings.SD_API_BASE)
+        # Get a cached (or freshly renewed) token and fetch lineups
+        token = await token_manager.get_token(db, sd_account)
         lineups = await sd_client.get_lineups(token)
         
         # Update last success
@@ -185,6 +178,7 @@ async def add_lineup(
     user_lineup = UserLineup(user_id=current_user.id, lineup_id=lineup_id)
     db.add(user_lineup)
     db.commit()
+    user_lineups_changed(str(current_user.id))
     
     return {"message": "Lineup added successfully"}
 
@@ -208,5 +202,6 @@ async def remove_lineup(
     
     db.delete(user_lineup)
     db.commit()
+    user_lineups_changed(str(current_user.id))
     
     return {"message": "Lineup removed successfully"}
\ No newline at end of file
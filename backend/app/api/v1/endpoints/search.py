@@ -1,20 +1,63 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from datetime import datetime, timezone
 
-from app.core.database import get_db
-from app.api.v1.endpoints.sd import get_current_user
+from app.api.conditional import get_user_validators
+from app.api.deps import get_current_user
+from app.core.database import get_async_db
 from app.models.core import User
+from app.services.ical import get_user_lineup_ids
+from app.services.search import search_programs as run_search, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.suggest import get_suggest_index, MAX_SUGGESTIONS
+from app.services.versions import CATALOG_VERSION_KEY
 
 router = APIRouter()
 
 @router.get("/")
 async def search_programs(
-    q: str = Query(..., description="Search query"),
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Search query"),
     genre: Optional[str] = Query(None, description="Filter by genre"),
     new_only: Optional[bool] = Query(None, description="Show only new episodes"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Results per page"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Search programs and schedules"""
-    return {"message": "Search endpoint - implementation needed"}
+    # Results change with the catalog, the user's lineups and their airings, and hourly as upcoming airings start;
+    # all read from Redis, so an unchanged poll runs no query
+    user_id = str(current_user.id)
+    hour = datetime.now(timezone.utc).strftime("%Y%m%d%H")
+    validators = await get_user_validators(
+        request,
+        user_id,
+        lambda: get_user_lineup_ids(db, user_id),
+        [CATALOG_VERSION_KEY],
+        variant=f"{user_id}:{hour}",
+        vary="Authorization"
+    )
+    if validators and validators.matches(request):
+        return validators.not_modified()
+
+    try:
+        results = await run_search(
+            db, user_id, q, genre=genre, new_only=bool(new_only), limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return JSONResponse(results, headers=validators.headers if validators else None)
+
+@router.get("/suggest")
+async def suggest(
+    q: str = Query(..., min_length=1, max_length=100, description="Prefix typed so far"),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS, description="Maximum suggestions"),
+    current_user: User = Depends(get_current_user)
+):
+    """Get title, series and people suggestions for a prefix"""
+    # Served from the mmapped prefix index; no database access
+    index = await get_suggest_index()
+    return {"suggestions": index.suggest(q, limit) if index else []}
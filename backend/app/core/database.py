@@ -1,21 +1,52 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.core.config import settings
 
+is_sqlite = "sqlite" in settings.DB_URL
+
+# Pool sizing shared by the sync and async engines (SQLite uses a single static connection)
+pool_options = {} if is_sqlite else {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+}
+
+def get_async_db_url(url: str) -> str:
+    """Get the asyncio driver variant of a database URL"""
+    scheme, _, rest = url.partition("://")
+    if scheme in ("postgresql", "postgresql+psycopg2", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    return url
+
 # Create database engine
 engine = create_engine(
     settings.DB_URL,
     pool_pre_ping=True,
     echo=settings.DEBUG,
-    poolclass=StaticPool if "sqlite" in settings.DB_URL else None,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DB_URL else {}
+    poolclass=StaticPool if is_sqlite else None,
+    connect_args={"check_same_thread": False} if is_sqlite else {},
+    **pool_options
 )
 
-# Create session factory
+# Create async database engine for read-heavy endpoints
+async_engine = create_async_engine(
+    get_async_db_url(settings.DB_URL),
+    pool_pre_ping=True,
+    echo=settings.DEBUG,
+    poolclass=StaticPool if is_sqlite else None,
+    **pool_options
+)
+
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
 
 # Base class for ORM models
 Base = declarative_base()
@@ -26,4 +57,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
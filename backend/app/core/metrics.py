@@ -9,6 +9,18 @@ active_connections = Gauge('active_connections', 'Active connections')
 database_connections = Gauge('database_connections_active', 'Active database connections')
 redis_connections = Gauge('redis_connections_active', 'Active Redis connections')
 
+# Email delivery (worker)
+emails_sent = Counter('emails_sent_total', 'Emails handed to the SMTP server', ['result'])
+email_send_duration = Histogram('email_send_duration_seconds', 'Time to send one email on a pooled session')
+smtp_connections_opened = Counter('smtp_connections_opened_total', 'SMTP sessions opened')
+
+# Schedules Direct rate governor (state as last seen by this process)
+sd_governor_rate = Gauge('sd_governor_rate', 'Fleet-wide SD request rate currently allowed (req/s)')
+sd_governor_tokens = Gauge('sd_governor_tokens', 'Tokens left in the shared SD bucket')
+sd_governor_pause = Gauge('sd_governor_pause_seconds', 'Time left on a fleet-wide pause after a 429')
+sd_governor_wait = Histogram('sd_governor_wait_seconds', 'Time spent waiting for an SD request token')
+sd_rate_limited = Counter('sd_rate_limited_total', '429 responses received from SD')
+
 def setup_metrics(app: FastAPI):
     """Setup Prometheus metrics endpoint"""
     
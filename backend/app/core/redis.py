@@ -1,3 +1,4 @@
+import redis as redis_sync
 import redis.asyncio as redis
 from app.core.config import settings
 
@@ -7,4 +8,26 @@ redis_client = redis.from_url(
     encoding="utf-8",
     decode_responses=True,
     health_check_interval=30
-)
\ No newline at end of file
+)
+
+# Binary-safe client for precompressed cache payloads
+redis_binary_client = redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=False,
+    health_check_interval=30
+)
+
+# Synchronous client for ORM event hooks and worker code outside the event loop
+sync_redis_client = redis_sync.from_url(
+    settings.REDIS_URL,
+    encoding="utf-8",
+    decode_responses=True,
+    health_check_interval=30
+)
+
+# Synchronous binary-safe client for worker-built cache payloads
+sync_redis_binary_client = redis_sync.from_url(
+    settings.REDIS_URL,
+    decode_responses=False,
+    health_check_interval=30
+)
@@ -7,11 +7,12 @@ import logging
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import async_engine
 from app.core.redis import redis_client
 from app.api.v1.router import api_router
 from app.core.logging import setup_logging
 from app.core.metrics import setup_metrics
+from app.services.schedules_direct import get_sd_client, close_sd_client
 
 # Setup logging
 setup_logging()
@@ -34,10 +35,15 @@ async def lifespan(app: FastAPI):
     # Setup metrics
     setup_metrics(app)
     
+    # Shared SD client so handlers reuse pooled, warm connections
+    get_sd_client()
+    
     yield
     
     # Shutdown
     logger.info("Shutting down SD Browser API")
+    await close_sd_client()
+    await async_engine.dispose()
     await redis_client.close()
 
 # Create FastAPI app
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, Date, ARRAY, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, Date, JSON, Index, Computed, text
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR, ARRAY
 import uuid
 from datetime import datetime, timezone
 
@@ -24,6 +24,7 @@ class SchedulesDirectAccount(Base):
     user_id = Column(UUID(as_uuid=True), primary_key=True)
     sd_username = Column(String, nullable=False)
     sd_token = Column(Text, nullable=False)  # Encrypted
+    sd_password_hash = Column(Text)  # Encrypted SHA1, used to re-authenticate
     token_expires_at = Column(DateTime(timezone=True))
     last_success = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -82,9 +83,24 @@ class Program(Base):
     advisories = Column(ARRAY(String))
     cast = Column(JSON)
     crew = Column(JSON)
+    people = Column(Text)  # Cast and crew names, flattened for search
     md5 = Column(String, index=True)  # For deduplication
+    search_vector = Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(episode_title, '')), 'B') || "
+        "setweight(to_tsvector('simple', coalesce(people, '')), 'C') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'D')",
+        persisted=True
+    ))
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        Index("ix_programs_search_vector", "search_vector", postgresql_using="gin"),
+        # Fuzzy title matching (pg_trgm) for typos and partial words
+        Index("ix_programs_title_trgm", "title", postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"}),
+        Index("ix_programs_genres", "genres", postgresql_using="gin"),
+    )
 
 class Schedule(Base):
     __tablename__ = "schedules"
@@ -101,6 +117,29 @@ class Schedule(Base):
     aspect = Column(String)  # 16:9, 4:3
     subtitles = Column(ARRAY(String))
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        # Upcoming airings of a program, for search and rule matching
+        Index("ix_schedules_program_start", "program_id", "start_utc"),
+        # Answers "airings on this station overlapping a window" for the guide grid
+        Index(
+            "ix_schedules_station_airing",
+            "station_id",
+            text("tstzrange(start_utc, end_utc, '[)')"),
+            postgresql_using="gist"
+        ),
+        # One partition per UTC day, managed by app.services.partitions
+        {"postgresql_partition_by": "RANGE (start_utc)"},
+    )
+
+class ScheduleMD5(Base):
+    __tablename__ = "schedule_md5s"
+    
+    station_id = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)  # SD schedule day (UTC)
+    md5 = Column(String, nullable=False)
+    last_modified = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
 class Image(Base):
     __tablename__ = "images"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, Enum
+from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, Enum, Index, text
 from sqlalchemy.dialects.postgresql import UUID, ARRAY
 import uuid
 from datetime import datetime, timezone
@@ -45,7 +45,15 @@ class Notification(Base):
     station_id = Column(String)
     program_id = Column(String)
     start_utc = Column(DateTime(timezone=True))
-    status = Column(String, default="pending")  # pending, sent, suppressed
+    status = Column(String, default="pending")  # pending, sending, sent, suppressed, failed
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")  # Delivery attempts that failed
+    next_attempt_at = Column(DateTime(timezone=True))  # Retry backoff; NULL means due now
     message = Column(Text)
+    idempotency_key = Column(String, unique=True, index=True)  # One notification per user/rule/airing
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (
+        # The dispatcher only ever scans pending rows
+        Index("ix_notifications_pending", "created_at", postgresql_where=text("status = 'pending'")),
+    )
\ No newline at end of file
@@ -0,0 +1,182 @@
+import io
+import json
+import logging
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from datetime import date, datetime, timezone
+
+from sqlalchemy import Table, ARRAY, JSON
+from sqlalchemy.orm import Session
+
+from app.models.core import Schedule
+
+logger = logging.getLogger(__name__)
+
+def _copy_array(values: List[Any]) -> str:
+    """Encode a list as a PostgreSQL array literal"""
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append("NULL")
+        else:
+            escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            elements.append(f'"{escaped}"')
+    return "{" + ",".join(elements) + "}"
+
+def _copy_field(value: Any, column_type: Any) -> str:
+    """Encode one value for COPY ... FROM STDIN text format"""
+    if value is None:
+        return "\\N"
+    if isinstance(column_type, ARRAY):
+        text = _copy_array(value)
+    elif isinstance(column_type, JSON):
+        text = json.dumps(value)
+    elif isinstance(value, bool):
+        text = "t" if value else "f"
+    elif isinstance(value, (datetime, date)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+class BulkWriter:
+    """Load ingest rows into PostgreSQL via COPY and one set-based merge per table.
+
+    Rows are COPYed into per-session temporary staging tables, which Postgres
+    never WAL-logs, then merged with a single INSERT ... ON CONFLICT DO UPDATE.
+    The caller owns the transaction; staging rows are discarded on commit.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _cursor(self):
+        # Raw DBAPI cursor on the session's connection, inside its transaction
+        return self.db.connection().connection.cursor()
+
+    def _staging_table(self, cursor, table: Table) -> str:
+        """Create (if needed) and empty the staging table for `table`"""
+        staging = f"staging_{table.name}"
+        # The session may hand out a different pooled connection per transaction
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+            f"(LIKE {table.name} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cursor.execute(f"TRUNCATE {staging}")
+        return staging
+
+    def _copy_rows(self, cursor, staging: str, table: Table, columns: List[str], rows: Iterable[Dict[str, Any]]) -> int:
+        """COPY rows into a staging table"""
+        types = [table.c[column].type for column in columns]
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            buffer.write("\t".join(_copy_field(row.get(column), t) for column, t in zip(columns, types)))
+            buffer.write("\n")
+            count += 1
+        buffer.seek(0)
+
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN", buffer)
+        return count
+
+    def _merge(self, cursor, table: Table, staging: str, columns: List[str], change_columns: Optional[List[str]]) -> int:
+        """Merge a loaded staging table into its target with one INSERT ... ON CONFLICT"""
+        keys = [column.name for column in table.primary_key.columns]
+        timestamp_columns = [
+            column for column in ("created_at", "updated_at")
+            if column in table.c and column not in columns
+        ]
+
+        insert_columns = ", ".join(f'"{column}"' for column in columns + timestamp_columns)
+        select_columns = ", ".join([f'"{column}"' for column in columns] + ["now()"] * len(timestamp_columns))
+        key_list = ", ".join(f'"{key}"' for key in keys)
+
+        updates = [f'"{column}" = EXCLUDED."{column}"' for column in columns if column not in keys]
+        if "updated_at" in timestamp_columns:
+            updates.append('"updated_at" = now()')
+
+        if updates:
+            conflict = f"DO UPDATE SET {', '.join(updates)}"
+            if change_columns:
+                current = ", ".join(f'{table.name}."{column}"' for column in change_columns)
+                incoming = ", ".join(f'EXCLUDED."{column}"' for column in change_columns)
+                conflict += f" WHERE ({current}) IS DISTINCT FROM ({incoming})"
+        else:
+            conflict = "DO NOTHING"
+
+        # DISTINCT ON keeps a key that appears twice in one batch from failing the merge
+        cursor.execute(
+            f"INSERT INTO {table.name} ({insert_columns}) "
+            f"SELECT DISTINCT ON ({key_list}) {select_columns} FROM {staging} ORDER BY {key_list} "
+            f"ON CONFLICT ({key_list}) {conflict}"
+        )
+        return cursor.rowcount
+
+    def upsert(self, table: Table, rows: List[Dict[str, Any]], change_columns: Optional[List[str]] = None) -> int:
+        """Insert or update rows keyed on the table's primary key.
+
+        If `change_columns` is given, existing rows are only rewritten when one
+        of those columns differs, which avoids dead tuples for no-op updates.
+        """
+        if not rows:
+            return 0
+
+        columns = [column for column in rows[0] if column in table.c]
+        cursor = self._cursor()
+        try:
+            staging = self._staging_table(cursor, table)
+            self._copy_rows(cursor, staging, table, columns, rows)
+            return self._merge(cursor, table, staging, columns, change_columns)
+        finally:
+            cursor.close()
+
+    def replace_schedules(self, rows: List[Dict[str, Any]], station_days: List[Tuple[str, date]]) -> int:
+        """Make the given station-days contain exactly `rows`.
+
+        Airings that disappeared from a re-fetched station-day are removed in
+        one DELETE, then the new airings are merged with a single upsert.
+        """
+        if not station_days:
+            return 0
+
+        cursor = self._cursor()
+        try:
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS staging_station_days "
+                "(station_id varchar NOT NULL, day_start timestamptz NOT NULL) ON COMMIT DELETE ROWS"
+            )
+            cursor.execute("TRUNCATE staging_station_days")
+
+            buffer = io.StringIO()
+            for station_id, day in station_days:
+                day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+                buffer.write(f"{_copy_field(station_id, None)}\t{day_start.isoformat()}\n")
+            buffer.seek(0)
+            cursor.copy_expert("COPY staging_station_days (station_id, day_start) FROM STDIN", buffer)
+
+            table = Schedule.__table__
+            staging = self._staging_table(cursor, table)
+            columns = [column for column in rows[0] if column in table.c] if rows else []
+            if rows:
+                self._copy_rows(cursor, staging, table, columns, rows)
+
+            cursor.execute(
+                f"DELETE FROM schedules s USING staging_station_days d "
+                f"WHERE s.station_id = d.station_id "
+                f"AND s.start_utc >= d.day_start AND s.start_utc < d.day_start + interval '1 day' "
+                f"AND NOT EXISTS (SELECT 1 FROM {staging} n WHERE n.station_id = s.station_id "
+                f"AND n.program_id = s.program_id AND n.start_utc = s.start_utc)"
+            )
+            removed = cursor.rowcount
+
+            written = 0
+            if rows:
+                written = self._merge(
+                    cursor, table, staging, columns,
+                    change_columns=["end_utc", "is_new", "live", "premiere", "finale", "audio", "aspect", "subtitles"]
+                )
+        finally:
+            cursor.close()
+
+        logger.debug(f"Replaced {len(station_days)} station-days: {written} written, {removed} removed")
+        return written
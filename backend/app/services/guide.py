@@ -0,0 +1,149 @@
+import re
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func, and_, null, bindparam, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.core import Schedule, Program, Station, LineupStation
+
+# Airings are sent as positional arrays; clients read the layout from the response
+AIRING_FIELDS = ["program_id", "start", "end", "flags"]
+
+# Bits in an airing's flags field
+FLAG_NEW = 1
+FLAG_LIVE = 2
+FLAG_PREMIERE = 4
+FLAG_FINALE = 8
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def channel_sort_key(channel: Optional[str]) -> Tuple:
+    """Sort channels numerically by major/minor number (e.g. 2.1 < 10 < 704)"""
+    if not channel:
+        return (1, ())
+    parts = re.split(r"[.\-]", channel)
+    return (0, tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in parts))
+
+def _airing_flags(is_new: bool, live: bool, premiere: bool, finale: bool) -> int:
+    return (
+        (FLAG_NEW if is_new else 0)
+        | (FLAG_LIVE if live else 0)
+        | (FLAG_PREMIERE if premiere else 0)
+        | (FLAG_FINALE if finale else 0)
+    )
+
+def _overlaps_window(start: datetime, end: datetime):
+    """Airing-overlaps-window predicate matching ix_schedules_station_airing"""
+    airing_range = func.tstzrange(Schedule.start_utc, Schedule.end_utc, "[)")
+    window = func.tstzrange(
+        bindparam("window_start", start, type_=DateTime(timezone=True)),
+        bindparam("window_end", end, type_=DateTime(timezone=True)),
+        "[)"
+    )
+    return airing_range.op("&&")(window)
+
+async def build_grid(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    lineup_id: Optional[str] = None,
+    station_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """Get every airing overlapping [start, end) for a lineup (or one station), grouped by station.
+
+    One query joins the lineup's stations to their overlapping airings and
+    programs. Program details are sent once in a shared map, however many
+    times a program airs in the window.
+    """
+    start, end = as_utc(start), as_utc(end)
+    channel_column = LineupStation.channel if lineup_id is not None else null()
+
+    stmt = (
+        select(
+            channel_column,
+            Station.id,
+            Station.callsign,
+            Station.name,
+            Station.logo_uri,
+            Schedule.program_id,
+            Schedule.start_utc,
+            Schedule.end_utc,
+            Schedule.is_new,
+            Schedule.live,
+            Schedule.premiere,
+            Schedule.finale,
+            Program.title,
+            Program.episode_title,
+            Program.season,
+            Program.episode,
+            Program.genres,
+        )
+        .select_from(Station)
+    )
+
+    if lineup_id is not None:
+        stmt = stmt.join(
+            LineupStation, LineupStation.station_id == Station.id
+        ).where(LineupStation.lineup_id == lineup_id)
+    else:
+        stmt = stmt.where(Station.id == station_id)
+
+    stmt = (
+        stmt
+        .outerjoin(Schedule, and_(Schedule.station_id == Station.id, _overlaps_window(start, end)))
+        .outerjoin(Program, Program.program_id == Schedule.program_id)
+        .order_by(Station.id, Schedule.start_utc)
+    )
+
+    stations: Dict[str, Dict[str, Any]] = {}
+    programs: Dict[str, Dict[str, Any]] = {}
+
+    result = await db.execute(stmt)
+    for row in result:
+        (
+            channel, sid, callsign, name, logo_uri, program_id, start_utc, end_utc,
+            is_new, live, premiere, finale, title, episode_title, season, episode, genres
+        ) = row
+
+        station = stations.get(sid)
+        if station is None:
+            station = stations[sid] = {
+                "station_id": sid,
+                "channel": channel,
+                "callsign": callsign,
+                "name": name,
+                "logo": logo_uri,
+                "airings": [],
+            }
+
+        if program_id is None:
+            continue
+
+        station["airings"].append([
+            program_id,
+            int(start_utc.timestamp()),
+            int(end_utc.timestamp()),
+            _airing_flags(is_new, live, premiere, finale),
+        ])
+        if program_id not in programs:
+            programs[program_id] = {
+                "title": title,
+                "episode_title": episode_title,
+                "season": season,
+                "episode": episode,
+                "genres": genres,
+            }
+
+    ordered = sorted(stations.values(), key=lambda s: (channel_sort_key(s["channel"]), s["station_id"]))
+
+    return {
+        "lineup_id": lineup_id,
+        "start": int(start.timestamp()),
+        "end": int(end.timestamp()),
+        "airing_fields": AIRING_FIELDS,
+        "stations": ordered,
+        "programs": programs,
+    }
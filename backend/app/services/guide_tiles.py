@@ -0,0 +1,187 @@
+import asyncio
+import gzip
+import json
+import logging
+from typing import Any, Dict, List, Set, Tuple
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_binary_client
+from app.models.core import LineupStation
+from app.services.guide import build_grid, as_utc, AIRING_FIELDS
+
+logger = logging.getLogger(__name__)
+
+TILE_SECONDS = settings.GUIDE_TILE_HOURS * 3600
+
+# Airings that start late in a station-day can run this far into the next one
+MAX_AIRING_SPILL = timedelta(hours=6)
+
+# A (lineup ID, slot start epoch) pair identifies one tile
+Tile = Tuple[str, int]
+
+# Tiles being built in this process, so concurrent misses share one query
+_inflight: Dict[Tile, "asyncio.Future[bytes]"] = {}
+
+def tile_key(lineup_id: str, slot: int) -> str:
+    return f"guide:tile:{lineup_id}:{slot}"
+
+def tile_slots(start: datetime, end: datetime) -> List[int]:
+    """Get the aligned tile slots covering [start, end)"""
+    start_ts = int(as_utc(start).timestamp())
+    end_ts = int(as_utc(end).timestamp())
+    first = start_ts - start_ts % TILE_SECONDS
+    return list(range(first, end_ts, TILE_SECONDS))
+
+def _slot_window(slot: int) -> Tuple[datetime, datetime]:
+    start = datetime.fromtimestamp(slot, timezone.utc)
+    return start, start + timedelta(seconds=TILE_SECONDS)
+
+def _encode(grid: Dict[str, Any]) -> bytes:
+    """Serialize and compress a grid once, at build time"""
+    return gzip.compress(json.dumps(grid, separators=(",", ":")).encode(), compresslevel=6)
+
+async def build_tile(db: AsyncSession, lineup_id: str, slot: int) -> bytes:
+    """Build one tile from Postgres and store it in Redis"""
+    start, end = _slot_window(slot)
+    payload = _encode(await build_grid(db, start, end, lineup_id=lineup_id))
+    await redis_binary_client.set(tile_key(lineup_id, slot), payload, ex=settings.GUIDE_TILE_TTL_SECONDS)
+    return payload
+
+async def _load_missing_tile(db: AsyncSession, lineup_id: str, slot: int) -> bytes:
+    tile = (lineup_id, slot)
+    pending = _inflight.get(tile)
+    if pending is not None:
+        return await pending
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[tile] = future
+    try:
+        payload = await build_tile(db, lineup_id, slot)
+        future.set_result(payload)
+        return payload
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception retrieved in case nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(tile, None)
+
+async def get_tiles(db: AsyncSession, lineup_id: str, slots: List[int]) -> List[bytes]:
+    """Get compressed tiles from Redis, building any that are missing"""
+    cached = await redis_binary_client.mget([tile_key(lineup_id, slot) for slot in slots])
+    tiles = []
+    for slot, payload in zip(slots, cached):
+        if payload is None:
+            payload = await _load_missing_tile(db, lineup_id, slot)
+        tiles.append(payload)
+    return tiles
+
+def merge_tiles(tiles: List[Dict[str, Any]], lineup_id: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """Assemble a grid for [start, end) from consecutive tiles"""
+    start_ts = int(as_utc(start).timestamp())
+    end_ts = int(as_utc(end).timestamp())
+
+    stations: Dict[str, Dict[str, Any]] = {}
+    seen: Dict[str, Set[Tuple[str, int]]] = {}
+    programs: Dict[str, Dict[str, Any]] = {}
+
+    for tile in tiles:
+        for station in tile["stations"]:
+            station_id = station["station_id"]
+            merged = stations.get(station_id)
+            if merged is None:
+                merged = stations[station_id] = {**station, "airings": []}
+                seen[station_id] = set()
+
+            for airing in station["airings"]:
+                program_id, airing_start, airing_end = airing[0], airing[1], airing[2]
+                # Airings spanning a tile boundary appear in both tiles
+                if airing_end <= start_ts or airing_start >= end_ts or (program_id, airing_start) in seen[station_id]:
+                    continue
+                seen[station_id].add((program_id, airing_start))
+                merged["airings"].append(airing)
+                programs.setdefault(program_id, tile["programs"][program_id])
+
+    return {
+        "lineup_id": lineup_id,
+        "start": start_ts,
+        "end": end_ts,
+        "airing_fields": AIRING_FIELDS,
+        "stations": list(stations.values()),
+        "programs": programs,
+    }
+
+async def get_grid_payload(
+    db: AsyncSession,
+    lineup_id: str,
+    start: datetime,
+    end: datetime,
+    accept_gzip: bool
+) -> Tuple[bytes, bool]:
+    """Get a serialized guide grid assembled from tiles; returns (body, is_gzipped)"""
+    slots = tile_slots(start, end)
+    tiles = await get_tiles(db, lineup_id, slots)
+
+    # A request for exactly one tile is served as stored, with no decoding at all
+    if len(slots) == 1 and _slot_window(slots[0]) == (as_utc(start), as_utc(end)):
+        return (tiles[0], True) if accept_gzip else (gzip.decompress(tiles[0]), False)
+
+    # Any other window is merged, then compressed like a stored tile when the client accepts it
+    grid = merge_tiles([json.loads(gzip.decompress(tile)) for tile in tiles], lineup_id, start, end)
+    if accept_gzip:
+        return _encode(grid), True
+    return json.dumps(grid, separators=(",", ":")).encode(), False
+
+def affected_tiles(db: Session, station_days: List[Tuple[str, str]]) -> List[Tile]:
+    """Get the tiles covering changed station-days, for every lineup carrying those stations"""
+    days_by_station: Dict[str, Set[date]] = {}
+    for station_id, day in station_days:
+        days_by_station.setdefault(station_id, set()).add(date.fromisoformat(str(day)))
+
+    if not days_by_station:
+        return []
+
+    lineups_by_station: Dict[str, List[str]] = {}
+    for lineup_id, station_id in db.query(LineupStation.lineup_id, LineupStation.station_id).filter(
+        LineupStation.station_id.in_(list(days_by_station))
+    ):
+        lineups_by_station.setdefault(station_id, []).append(lineup_id)
+
+    tiles: Set[Tile] = set()
+    for station_id, days in days_by_station.items():
+        for day in days:
+            day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+            slots = tile_slots(day_start, day_start + timedelta(days=1) + MAX_AIRING_SPILL)
+            for lineup_id in lineups_by_station.get(station_id, []):
+                tiles.update((lineup_id, slot) for slot in slots)
+
+    return sorted(tiles)
+
+async def rebuild_tiles(db: AsyncSession, tiles: List[Tile], only_cached: bool = True) -> int:
+    """Rebuild tiles in place; by default only those currently cached, the rest build on demand"""
+    if only_cached and tiles:
+        async with redis_binary_client.pipeline(transaction=False) as pipe:
+            for lineup_id, slot in tiles:
+                pipe.exists(tile_key(lineup_id, slot))
+            exists = await pipe.execute()
+        tiles = [tile for tile, found in zip(tiles, exists) if found]
+
+    for lineup_id, slot in tiles:
+        await build_tile(db, lineup_id, slot)
+
+    logger.info(f"Rebuilt {len(tiles)} guide tiles")
+    return len(tiles)
+
+async def drop_lineup_tiles(lineup_ids: List[str]) -> int:
+    """Delete every cached tile for lineups whose channel map changed"""
+    dropped = 0
+    for lineup_id in lineup_ids:
+        keys = [key async for key in redis_binary_client.scan_iter(match=f"guide:tile:{lineup_id}:*", count=500)]
+        if keys:
+            dropped += await redis_binary_client.delete(*keys)
+    return dropped
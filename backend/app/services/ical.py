@@ -0,0 +1,166 @@
+import logging
+import uuid
+from typing import Any, AsyncIterator, List, Optional
+from datetime import datetime, timezone
+
+from sqlalchemy import select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.redis import redis_binary_client
+from app.models.core import Schedule, Program, Station, LineupStation, UserLineup
+from app.models.user_data import Favourite, Notification
+
+logger = logging.getLogger(__name__)
+
+PRODID = "-//SD Browser//Guide Calendar//EN"
+
+# Rows fetched per round trip from the server-side cursor
+FEED_FETCH_SIZE = 1000
+
+def ical_cache_key(user_id: str, version: str) -> str:
+    return f"ical:{user_id}:{version}"
+
+def ical_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+def escape_text(value: str) -> str:
+    """Escape a TEXT property value (RFC 5545 3.3.11)"""
+    return (
+        value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+def fold_line(line: str) -> bytes:
+    """Encode a content line, folded at 75 octets without splitting characters"""
+    parts: List[bytes] = []
+    current = b""
+    for char in line:
+        encoded = char.encode("utf-8")
+        if len(current) + len(encoded) > 75:
+            parts.append(current)
+            current = b" "
+        current += encoded
+    parts.append(current)
+    return b"\r\n".join(parts) + b"\r\n"
+
+def event_lines(row: Any, stamp: str) -> bytes:
+    """Render one VEVENT for an airing"""
+    summary = row.title or row.program_id
+    if row.episode_title:
+        summary = f"{summary} - {row.episode_title}"
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{row.station_id}-{row.program_id}-{int(row.start_utc.timestamp())}@sd-browser",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{ical_time(row.start_utc)}",
+        f"DTEND:{ical_time(row.end_utc)}",
+        f"SUMMARY:{escape_text(summary)}",
+    ]
+    if row.callsign:
+        lines.append(f"LOCATION:{escape_text(row.callsign)}")
+    if row.description:
+        lines.append(f"DESCRIPTION:{escape_text(row.description)}")
+    lines.append("END:VEVENT")
+    return b"".join(fold_line(line) for line in lines)
+
+def feed_query(user_id: str, start: datetime, end: datetime):
+    """Airings of the user's favourites and rule matches on their stations, in time order"""
+    user_uuid = uuid.UUID(user_id)
+    columns = (
+        Schedule.station_id,
+        Schedule.program_id,
+        Schedule.start_utc,
+        Schedule.end_utc,
+        Program.title,
+        Program.episode_title,
+        Program.description,
+        Station.callsign,
+    )
+    user_stations = (
+        select(LineupStation.station_id)
+        .join(UserLineup, UserLineup.lineup_id == LineupStation.lineup_id)
+        .where(UserLineup.user_id == user_uuid)
+    )
+    favourites = (
+        select(*columns)
+        .join(Favourite, Favourite.program_id == Schedule.program_id)
+        .join(Program, Program.program_id == Schedule.program_id)
+        .join(Station, Station.id == Schedule.station_id)
+        .where(
+            Favourite.user_id == user_uuid,
+            Schedule.station_id.in_(user_stations),
+            Schedule.start_utc >= start,
+            Schedule.start_utc < end
+        )
+    )
+    # Rule matches are recorded as notifications, whatever their delivery status
+    rule_matches = (
+        select(*columns)
+        .join(
+            Notification,
+            (Notification.station_id == Schedule.station_id)
+            & (Notification.program_id == Schedule.program_id)
+            & (Notification.start_utc == Schedule.start_utc)
+        )
+        .join(Program, Program.program_id == Schedule.program_id)
+        .join(Station, Station.id == Schedule.station_id)
+        .where(
+            Notification.user_id == user_uuid,
+            Schedule.start_utc >= start,
+            Schedule.start_utc < end
+        )
+    )
+    # UNION also drops airings that are both a favourite and a rule match
+    feed = union(favourites, rule_matches).subquery()
+    return select(feed).order_by(feed.c.start_utc, feed.c.station_id)
+
+async def get_user_lineup_ids(db: AsyncSession, user_id: str) -> List[str]:
+    """Get the ids of the user's lineups"""
+    result = await db.execute(select(UserLineup.lineup_id).where(UserLineup.user_id == uuid.UUID(user_id)))
+    return list(result.scalars())
+
+async def get_cached_feed(cache_key: str) -> Optional[bytes]:
+    """Get a previously generated feed, or None if it is not cached"""
+    try:
+        return await redis_binary_client.get(cache_key)
+    except Exception as e:
+        logger.warning(f"iCal cache unavailable: {e}")
+        return None
+
+async def stream_ical_feed(user_id: str, start: datetime, end: datetime, cache_key: Optional[str] = None) -> AsyncIterator[bytes]:
+    """Yield a user's calendar as it is generated, caching the finished feed under `cache_key`"""
+    chunks: List[bytes] = []
+    stamp = ical_time(datetime.now(timezone.utc))
+
+    header = b"".join(fold_line(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:SD Browser",
+    ))
+    chunks.append(header)
+    yield header
+
+    events = 0
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(feed_query(user_id, start, end).execution_options(yield_per=FEED_FETCH_SIZE))
+        async for rows in result.partitions():
+            chunk = b"".join(event_lines(row, stamp) for row in rows)
+            events += len(rows)
+            chunks.append(chunk)
+            yield chunk
+
+    footer = fold_line("END:VCALENDAR")
+    chunks.append(footer)
+    yield footer
+
+    # Only a feed that was generated to the end is cached
+    if cache_key is not None:
+        try:
+            await redis_binary_client.set(cache_key, b"".join(chunks), ex=settings.ICAL_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to cache iCal feed: {e}")
+    logger.info(f"Generated iCal feed for user {user_id} with {events} events")
@@ -0,0 +1,473 @@
+import logging
+from typing import AsyncIterator, Dict, List, Any, Optional, Set, Tuple
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.models.core import (
+    SchedulesDirectAccount, Lineup, UserLineup, Station, LineupStation, Program, ScheduleMD5, Image
+)
+from app.services.bulk_writer import BulkWriter
+from app.services.ingest_planner import get_lineup_coverage, get_station_coverage, get_ready_accounts, assign_fetches
+from app.services.partitions import ensure_schedule_partitions
+from app.services.schedules_direct import SchedulesDirectClient, get_sd_client
+from app.services.sd_tokens import token_manager
+
+logger = logging.getLogger(__name__)
+
+# A station-day is the unit SD versions schedules by
+StationDay = Tuple[str, date]
+
+# Keep IN (...) lists to a size Postgres plans well
+LOOKUP_CHUNK_SIZE = 5000
+
+# Rows written per COPY/merge while SD responses stream in
+SCHEDULE_WRITE_BATCH = 20000
+PROGRAM_WRITE_BATCH = 5000
+IMAGE_WRITE_BATCH = 10000
+
+def schedule_dates(days: int, start: Optional[date] = None) -> List[date]:
+    """Get the SD schedule days covered by a refresh"""
+    start = start or datetime.now(timezone.utc).date()
+    return [start + timedelta(days=offset) for offset in range(days)]
+
+def parse_sd_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse an SD UTC timestamp (e.g. 2025-10-12T20:00:00Z)"""
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+def parse_airing(station_id: str, airing: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an SD schedule airing into Schedule column values"""
+    start_utc = parse_sd_datetime(airing["airDateTime"])
+    audio_properties = airing.get("audioProperties", [])
+    video_properties = airing.get("videoProperties", [])
+
+    return {
+        "station_id": station_id,
+        "program_id": airing["programID"],
+        "start_utc": start_utc,
+        "end_utc": start_utc + timedelta(seconds=airing.get("duration", 0)),
+        "is_new": bool(airing.get("new", False)),
+        "live": airing.get("liveTapeDelay") == "Live",
+        "premiere": bool(airing.get("premiere", False)),
+        "finale": airing.get("isPremiereOrFinale", "").endswith("Finale"),
+        "audio": ", ".join(p for p in audio_properties if p not in ("cc", "subtitled")) or None,
+        "aspect": "16:9" if "hdtv" in video_properties else None,
+        "subtitles": [p for p in audio_properties if p in ("cc", "subtitled")] or None,
+    }
+
+def parse_program(program: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an SD program object into Program column values"""
+    titles = program.get("titles") or [{}]
+    descriptions = program.get("descriptions", {})
+    description_list = descriptions.get("description1000") or descriptions.get("description100") or [{}]
+
+    season = episode = None
+    for metadata in program.get("metadata", []):
+        gracenote = metadata.get("Gracenote")
+        if gracenote:
+            season = gracenote.get("season")
+            episode = gracenote.get("episode")
+            break
+
+    original_air_date = program.get("originalAirDate")
+    people = [person.get("name") for person in (program.get("cast") or []) + (program.get("crew") or [])]
+
+    return {
+        "program_id": program["programID"],
+        "title": titles[0].get("title120") or program["programID"],
+        "episode_title": program.get("episodeTitle150"),
+        "description": description_list[0].get("description"),
+        "season": season,
+        "episode": episode,
+        "original_air_date": date.fromisoformat(original_air_date) if original_air_date else None,
+        "genres": program.get("genres"),
+        "advisories": program.get("contentAdvisory"),
+        "cast": program.get("cast"),
+        "crew": program.get("crew"),
+        "people": " ".join(name for name in people if name) or None,
+        "md5": program.get("md5"),
+    }
+
+def parse_image(program_id: str, image: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convert an SD artwork entry into Image column values"""
+    uri = image.get("uri")
+    if not uri:
+        return None
+
+    return {
+        "ref_id": uri,
+        "program_id": program_id,
+        "category": image.get("category"),
+        "aspect": image.get("aspect"),
+        "uri": uri,
+        "width": int(image["width"]) if image.get("width") else None,
+        "height": int(image["height"]) if image.get("height") else None,
+    }
+
+def get_user_station_ids(db: Session, user_id: str) -> List[str]:
+    """Get the distinct stations across a user's lineups"""
+    rows = db.query(LineupStation.station_id).join(
+        UserLineup, UserLineup.lineup_id == LineupStation.lineup_id
+    ).filter(
+        UserLineup.user_id == user_id
+    ).distinct().all()
+    return [station_id for (station_id,) in rows]
+
+async def sync_lineups(db: Session, client: SchedulesDirectClient, token: str, lineup_ids: List[str]) -> Dict[str, Any]:
+    """Refresh lineup, station and channel mapping rows from SD"""
+    stats: Dict[str, Any] = {"stations": 0, "changed_lineups": []}
+
+    for lineup_id in lineup_ids:
+        details = await client.get_lineup_details(token, lineup_id)
+        metadata = details.get("metadata", {})
+
+        db.merge(Lineup(id=lineup_id, transport=metadata.get("transport")))
+
+        for station in details.get("stations", []):
+            logo = station.get("logo", {})
+            db.merge(Station(
+                id=station["stationID"],
+                callsign=station.get("callsign"),
+                name=station.get("name"),
+                affiliate=station.get("affiliate"),
+                is_hd="HD" in station.get("callsign", ""),
+                logo_uri=logo.get("URL"),
+                logo_width=logo.get("width"),
+                logo_height=logo.get("height")
+            ))
+            stats["stations"] += 1
+
+        channel_map: Dict[str, Optional[str]] = {}
+        for entry in details.get("map", []):
+            station_id = entry.get("stationID")
+            if station_id and station_id not in channel_map:
+                channel_map[station_id] = entry.get("channel")
+
+        current = dict(
+            db.query(LineupStation.station_id, LineupStation.channel).filter(LineupStation.lineup_id == lineup_id)
+        )
+        if current == channel_map:
+            continue
+
+        # Replace the channel map for the lineup
+        db.query(LineupStation).filter(LineupStation.lineup_id == lineup_id).delete()
+        for station_id, channel in channel_map.items():
+            db.add(LineupStation(lineup_id=lineup_id, station_id=station_id, channel=channel))
+        stats["changed_lineups"].append(lineup_id)
+
+    db.commit()
+    return stats
+
+async def find_changed_station_days(
+    db: Session,
+    client: SchedulesDirectClient,
+    token: str,
+    station_ids: List[str],
+    dates: List[date]
+) -> Dict[StationDay, Dict[str, Any]]:
+    """Compare SD schedule MD5s with stored ones and return station-days that changed"""
+    remote = await client.get_schedule_md5s(token, station_ids, [d.isoformat() for d in dates])
+
+    stored = {
+        (row.station_id, row.date): row.md5
+        for row in db.query(ScheduleMD5).filter(
+            ScheduleMD5.station_id.in_(station_ids),
+            ScheduleMD5.date.in_(dates)
+        )
+    }
+
+    changed: Dict[StationDay, Dict[str, Any]] = {}
+    for station_id, days in remote.items():
+        for day_str, info in days.items():
+            # Non-zero codes mean SD has no schedule for that day yet
+            if info.get("code", 0) != 0 or not info.get("md5"):
+                continue
+            key = (station_id, date.fromisoformat(day_str))
+            if stored.get(key) != info["md5"]:
+                changed[key] = info
+
+    return changed
+
+async def sync_schedules(
+    db: Session,
+    client: SchedulesDirectClient,
+    token: str,
+    station_ids: List[str],
+    days: int = 14
+) -> Dict[str, Any]:
+    """Fetch and store schedules only for station-days whose SD MD5 changed.
+
+    The new schedule MD5s are returned in `schedule_md5s` rather than
+    written, so the caller can record them (store_schedule_md5s) once the
+    programs those airings reference are stored. Until then a failed run
+    leaves the station-days looking changed and the next run retries them.
+    """
+    dates = schedule_dates(days)
+    changed = await find_changed_station_days(db, client, token, station_ids, dates)
+
+    stats: Dict[str, Any] = {
+        "station_days": len(station_ids) * len(dates),
+        "station_days_changed": len(changed),
+        "airings": 0,
+        "changed_station_days": [],
+        "program_md5s": {},
+        "schedule_md5s": [],
+    }
+
+    if not changed:
+        logger.info(f"Schedules unchanged for {len(station_ids)} stations")
+        return stats
+
+    # Normally made ahead by the maintenance job; an airing can start on the day after the last date
+    ensure_schedule_partitions(db, dates[0], dates[-1] + timedelta(days=1))
+    db.commit()
+
+    station_dates: Dict[str, List[str]] = {}
+    for station_id, day in changed:
+        station_dates.setdefault(station_id, []).append(day.isoformat())
+
+    writer = BulkWriter(db)
+    rows: List[Dict[str, Any]] = []
+    station_days: List[StationDay] = []
+
+    def flush():
+        writer.replace_schedules(rows, station_days)
+        db.commit()
+        rows.clear()
+        station_days.clear()
+
+    async for schedule in client.iter_schedules(token, station_dates):
+        station_id = schedule.get("stationID")
+        metadata = schedule.get("metadata", {})
+        if not station_id or "startDate" not in metadata:
+            continue
+
+        day = date.fromisoformat(metadata["startDate"])
+        info = changed.get((station_id, day), {})
+        for airing in schedule.get("programs", []):
+            rows.append(parse_airing(station_id, airing))
+            if airing.get("md5"):
+                stats["program_md5s"][airing["programID"]] = airing["md5"]
+
+        station_days.append((station_id, day))
+        stats["schedule_md5s"].append({
+            "station_id": station_id,
+            "date": day,
+            "md5": metadata.get("md5") or info.get("md5"),
+            "last_modified": parse_sd_datetime(metadata.get("modified") or info.get("lastModified")),
+        })
+        stats["airings"] += len(schedule.get("programs", []))
+        stats["changed_station_days"].append((station_id, day.isoformat()))
+
+        if len(rows) >= SCHEDULE_WRITE_BATCH:
+            flush()
+
+    flush()
+    logger.info(
+        f"Refreshed {len(stats['changed_station_days'])}/{stats['station_days']} station-days "
+        f"({stats['airings']} airings)"
+    )
+    return stats
+
+def store_schedule_md5s(db: Session, md5_rows: List[Dict[str, Any]]):
+    """Record schedule MD5s from sync_schedules, marking those station-days as complete"""
+    if md5_rows:
+        BulkWriter(db).upsert(ScheduleMD5.__table__, md5_rows)
+        db.commit()
+
+def find_stale_programs(db: Session, program_md5s: Dict[str, str]) -> List[str]:
+    """Get airing program IDs that are unknown or whose stored MD5 differs"""
+    program_ids = list(program_md5s)
+    stored: Dict[str, Optional[str]] = {}
+
+    for offset in range(0, len(program_ids), LOOKUP_CHUNK_SIZE):
+        chunk = program_ids[offset:offset + LOOKUP_CHUNK_SIZE]
+        stored.update(
+            db.query(Program.program_id, Program.md5).filter(Program.program_id.in_(chunk)).all()
+        )
+
+    return [
+        program_id for program_id, md5 in program_md5s.items()
+        if stored.get(program_id) != md5
+    ]
+
+async def sync_programs(
+    db: Session,
+    client: SchedulesDirectClient,
+    token: str,
+    program_md5s: Dict[str, str]
+) -> Dict[str, Any]:
+    """Fetch program metadata only for programs that are unknown or whose MD5 changed"""
+    stale = find_stale_programs(db, program_md5s)
+
+    stats: Dict[str, Any] = {
+        "programs_seen": len(program_md5s),
+        "programs_skipped": len(program_md5s) - len(stale),
+        "programs_fetched": 0,
+        "fetched_program_ids": [],
+    }
+
+    if not stale:
+        logger.info(f"All {len(program_md5s)} programs unchanged, skipping /programs")
+        return stats
+
+    writer = BulkWriter(db)
+    rows: List[Dict[str, Any]] = []
+
+    def flush():
+        writer.upsert(Program.__table__, rows)
+        db.commit()
+        stats["programs_fetched"] += len(rows)
+        stats["fetched_program_ids"].extend(row["program_id"] for row in rows)
+        rows.clear()
+
+    # Write each batch as it streams in instead of waiting for the whole response
+    async for program in client.iter_programs(token, stale):
+        if "programID" not in program:
+            continue
+        rows.append(parse_program(program))
+        if len(rows) >= PROGRAM_WRITE_BATCH:
+            flush()
+
+    flush()
+    logger.info(
+        f"Fetched {stats['programs_fetched']} programs, "
+        f"skipped {stats['programs_skipped']} unchanged"
+    )
+    return stats
+
+async def sync_images(
+    db: Session,
+    client: SchedulesDirectClient,
+    token: str,
+    program_ids: List[str]
+) -> Dict[str, Any]:
+    """Fetch artwork for newly fetched programs, keyed by their SD artwork root ID"""
+    # SD serves artwork per series/movie root, shared by every episode
+    root_ids = sorted({program_id[:10] for program_id in program_ids})
+    stats: Dict[str, Any] = {"image_roots": len(root_ids), "images": 0}
+
+    if not root_ids:
+        return stats
+
+    writer = BulkWriter(db)
+    rows: List[Dict[str, Any]] = []
+
+    def flush():
+        writer.upsert(Image.__table__, rows, change_columns=["program_id", "category", "aspect", "width", "height"])
+        db.commit()
+        stats["images"] += len(rows)
+        rows.clear()
+
+    async for program_id, images in client.iter_images(token, root_ids):
+        for image in images:
+            row = parse_image(program_id, image)
+            if row:
+                rows.append(row)
+        if len(rows) >= IMAGE_WRITE_BATCH:
+            flush()
+
+    flush()
+    logger.info(f"Stored {stats['images']} images for {len(root_ids)} artwork roots")
+    return stats
+
+async def ingest_user_schedules(db: Session, user_id: str, days: int = 14) -> Dict[str, Any]:
+    """Run an incremental schedule ingest for one user's lineups"""
+    sd_account = db.query(SchedulesDirectAccount).filter(
+        SchedulesDirectAccount.user_id == user_id
+    ).first()
+
+    if not sd_account:
+        raise ValueError(f"No Schedules Direct account connected for user {user_id}")
+
+    token = await token_manager.get_token(db, sd_account)
+    lineup_ids = [
+        lineup_id for (lineup_id,) in db.query(UserLineup.lineup_id).filter(UserLineup.user_id == user_id)
+    ]
+
+    client = get_sd_client()
+    lineup_stats = await sync_lineups(db, client, token, lineup_ids)
+    station_ids = get_user_station_ids(db, user_id)
+    stats = await sync_schedules(db, client, token, station_ids, days)
+    stats["changed_lineups"] = lineup_stats["changed_lineups"]
+    stats.update(await sync_programs(db, client, token, stats.pop("program_md5s")))
+    # Only now are the station-days complete; a failure above retries them next run
+    store_schedule_md5s(db, stats.pop("schedule_md5s"))
+    stats.update(await sync_images(db, client, token, stats["fetched_program_ids"]))
+
+    sd_account.last_success = datetime.now(timezone.utc)
+    db.commit()
+
+    return stats
+
+async def _planned_tokens(db: Session, plan: Dict[str, Set[str]], failed: Set[str]) -> AsyncIterator[Tuple[SchedulesDirectAccount, str, Set[str]]]:
+    """Yield (account, token, items) for each assignment, marking accounts without a usable token as failed"""
+    for user_id, items in plan.items():
+        sd_account = db.query(SchedulesDirectAccount).filter(SchedulesDirectAccount.user_id == user_id).first()
+        try:
+            token = await token_manager.get_token(db, sd_account)
+        except Exception as e:
+            logger.warning(f"Skipping SD account of user {user_id} in ingest plan: {e}")
+            failed.add(user_id)
+            continue
+        yield sd_account, token, items
+
+async def sync_planned_lineups(db: Session, lineup_coverage: Dict[str, Set[str]], preferred: Set[str], failed: Set[str]) -> Dict[str, Any]:
+    """Refresh every lineup any user has added, each through one account.
+
+    Lineups are assigned to as few accounts as can fetch them all. Work
+    assigned to an account whose token can't be renewed is re-planned over
+    the remaining accounts, which are added to `failed`.
+    """
+    client = get_sd_client()
+    stats: Dict[str, Any] = {"stations": 0, "changed_lineups": [], "accounts": []}
+
+    pending = set().union(*lineup_coverage.values()) if lineup_coverage else set()
+    while pending:
+        plan = assign_fetches({u: c for u, c in lineup_coverage.items() if u not in failed}, pending, preferred)
+        if not plan:
+            break
+        async for sd_account, token, lineup_ids in _planned_tokens(db, plan, failed):
+            lineup_stats = await sync_lineups(db, client, token, sorted(lineup_ids))
+            stats["stations"] += lineup_stats["stations"]
+            stats["changed_lineups"].extend(lineup_stats["changed_lineups"])
+            stats["accounts"].append(str(sd_account.user_id))
+            sd_account.last_success = datetime.now(timezone.utc)
+            db.commit()
+            pending -= lineup_ids
+
+    if pending:
+        logger.warning(f"{len(pending)} lineups could not be refreshed with any account")
+    return stats
+
+async def get_planned_token(db: Session, user_id: str, station_ids: List[str], failed: Set[str]) -> Tuple[str, str]:
+    """Get a token for fetching planned stations: the assigned account's, or any other account covering them all"""
+    needed = set(station_ids)
+
+    async def first_token(candidates: List[str]) -> Optional[Tuple[str, str]]:
+        for candidate in candidates:
+            if candidate in failed:
+                continue
+            async for sd_account, token, _ in _planned_tokens(db, {candidate: needed}, failed):
+                sd_account.last_success = datetime.now(timezone.utc)
+                db.commit()
+                return str(sd_account.user_id), token
+        return None
+
+    found = await first_token([user_id])
+    if found is not None:
+        return found
+
+    # Coverage is only worked out when the assigned account's token can't be renewed
+    lineup_coverage = get_lineup_coverage(db)
+    preferred = get_ready_accounts(db, lineup_coverage)
+    found = await first_token(sorted(
+        (other for other, stations in get_station_coverage(db, lineup_coverage).items()
+         if other != user_id and needed <= stations),
+        key=lambda other: (other not in preferred, other)
+    ))
+    if found is not None:
+        return found
+    raise ValueError(f"No SD account can fetch the {len(station_ids)} planned stations")
@@ -0,0 +1,105 @@
+import heapq
+import logging
+from typing import Dict, FrozenSet, Iterable, List, Set, Tuple
+from datetime import datetime, timezone
+
+from sqlalchemy.orm import Session
+
+from app.models.core import User, SchedulesDirectAccount, UserLineup, LineupStation
+
+logger = logging.getLogger(__name__)
+
+def get_lineup_coverage(db: Session) -> Dict[str, Set[str]]:
+    """Get the lineups each active user with a connected SD account has added"""
+    rows = db.query(UserLineup.user_id, UserLineup.lineup_id).join(
+        SchedulesDirectAccount, SchedulesDirectAccount.user_id == UserLineup.user_id
+    ).join(
+        User, User.id == UserLineup.user_id
+    ).filter(
+        User.is_active.is_(True)
+    )
+    coverage: Dict[str, Set[str]] = {}
+    for user_id, lineup_id in rows:
+        coverage.setdefault(str(user_id), set()).add(lineup_id)
+    return coverage
+
+def get_station_coverage(db: Session, lineup_coverage: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    """Get the stations each account can fetch, through the lineups it has added"""
+    lineup_ids = set().union(*lineup_coverage.values()) if lineup_coverage else set()
+    stations: Dict[str, Set[str]] = {}
+    for lineup_id, station_id in db.query(LineupStation.lineup_id, LineupStation.station_id).filter(
+        LineupStation.lineup_id.in_(lineup_ids)
+    ):
+        stations.setdefault(lineup_id, set()).add(station_id)
+
+    # Users on the same lineups share one set object, so coverage stays small for 5k users
+    by_lineups: Dict[FrozenSet[str], Set[str]] = {}
+    coverage: Dict[str, Set[str]] = {}
+    for user_id, user_lineups in lineup_coverage.items():
+        key = frozenset(user_lineups)
+        if key not in by_lineups:
+            by_lineups[key] = set().union(*(stations.get(lineup_id, set()) for lineup_id in key))
+        coverage[user_id] = by_lineups[key]
+    return coverage
+
+def get_ready_accounts(db: Session, user_ids: Iterable[str]) -> Set[str]:
+    """Get the accounts whose stored SD token is still valid, so using them costs no re-authentication"""
+    now = datetime.now(timezone.utc)
+    return {
+        str(user_id) for (user_id,) in db.query(SchedulesDirectAccount.user_id).filter(
+            SchedulesDirectAccount.user_id.in_(list(user_ids)),
+            SchedulesDirectAccount.token_expires_at > now
+        )
+    }
+
+def assign_fetches(coverage: Dict[str, Set[str]], needed: Set[str], preferred: Set[str] = frozenset()) -> Dict[str, Set[str]]:
+    """Assign every needed item (lineup or station) to exactly one account that can fetch it.
+
+    A greedy set cover: the account covering the most unassigned items is
+    taken first, so the plan uses as few tokens (and requests) as possible.
+    Ties go to `preferred` accounts, then by user id for a stable plan.
+    Gains only shrink as items are assigned, so each account's gain is
+    recomputed lazily when it reaches the top of the heap. Items no account
+    covers are left out.
+    """
+    remaining = set(needed)
+    heap = [
+        (-len(items & remaining), user_id not in preferred, user_id)
+        for user_id, items in coverage.items()
+    ]
+    heapq.heapify(heap)
+
+    plan: Dict[str, Set[str]] = {}
+    while remaining and heap:
+        _, not_preferred, user_id = heapq.heappop(heap)
+        gain = coverage[user_id] & remaining
+        if not gain:
+            continue
+        entry = (-len(gain), not_preferred, user_id)
+        if heap and entry > heap[0]:
+            # Stale estimate; requeue with the current gain
+            heapq.heappush(heap, entry)
+            continue
+        plan[user_id] = gain
+        remaining -= gain
+
+    if remaining:
+        logger.warning(f"{len(remaining)} items are not fetchable by any account")
+    return plan
+
+def plan_station_shards(
+    station_coverage: Dict[str, Set[str]],
+    preferred: Set[str],
+    failed: Set[str],
+    shard_size: int
+) -> List[Tuple[str, List[str]]]:
+    """Split the planned station fetches into (account, stations) shards of at most `shard_size` stations"""
+    needed = set().union(*station_coverage.values()) if station_coverage else set()
+    plan = assign_fetches({u: c for u, c in station_coverage.items() if u not in failed}, needed, preferred)
+
+    shards: List[Tuple[str, List[str]]] = []
+    for user_id, stations in sorted(plan.items()):
+        ordered = sorted(stations)
+        for offset in range(0, len(ordered), shard_size):
+            shards.append((user_id, ordered[offset:offset + shard_size]))
+    return shards
@@ -0,0 +1,360 @@
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+from datetime import date, datetime
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client, sync_redis_client
+from app.services.ingest import (
+    sync_planned_lineups, get_planned_token, sync_schedules, store_schedule_md5s, sync_programs, sync_images
+)
+from app.services.ingest_planner import (
+    get_lineup_coverage, get_station_coverage, get_ready_accounts, plan_station_shards
+)
+from app.services.schedules_direct import get_sd_client
+
+logger = logging.getLogger(__name__)
+
+# A full refresh runs as a graph of jobs: lineups -> schedule shards -> programs -> images -> finish.
+# Its progress and checkpoints live in Redis so any worker can pick up where another stopped.
+CURRENT_RUN_KEY = "ingest:run:current"
+RECENT_RUNS_KEY = "ingest:runs"
+RECENT_RUNS_KEPT = 20
+
+STAGE_LINEUPS = "lineups"
+STAGE_SCHEDULES = "schedules"
+STAGE_PROGRAMS = "programs"
+STAGE_IMAGES = "images"
+STAGE_DONE = "done"
+
+SHARD_PENDING = "pending"
+SHARD_RUNNING = "running"
+SHARD_DONE = "done"
+SHARD_FAILED = "failed"
+
+def run_key(run_id: str) -> str:
+    return f"ingest:run:{run_id}"
+
+def shard_key(run_id: str, shard: int) -> str:
+    return f"ingest:run:{run_id}:shard:{shard}"
+
+def program_md5s_key(run_id: str) -> str:
+    return f"ingest:run:{run_id}:program_md5s"
+
+def changed_key(run_id: str) -> str:
+    return f"ingest:run:{run_id}:changed"
+
+def schedule_md5s_key(run_id: str) -> str:
+    return f"ingest:run:{run_id}:schedule_md5s"
+
+def fetched_key(run_id: str) -> str:
+    return f"ingest:run:{run_id}:fetched"
+
+def _touch(pipe, run_id: str, *keys: str):
+    """Refresh the run's heartbeat and the expiry of the keys written"""
+    now = time.time()
+    pipe.hset(run_key(run_id), "updated_at", now)
+    for key in (run_key(run_id),) + keys:
+        pipe.expire(key, settings.INGEST_RUN_TTL_SECONDS)
+
+def create_run(days: int) -> str:
+    """Start tracking a new full refresh and make it the current run"""
+    run_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    pipe = sync_redis_client.pipeline(transaction=True)
+    pipe.hset(run_key(run_id), mapping={
+        "run_id": run_id, "days": days, "stage": STAGE_LINEUPS, "shards": 0, "created_at": now,
+    })
+    pipe.set(CURRENT_RUN_KEY, run_id, ex=settings.INGEST_RUN_TTL_SECONDS)
+    pipe.lpush(RECENT_RUNS_KEY, run_id)
+    pipe.ltrim(RECENT_RUNS_KEY, 0, RECENT_RUNS_KEPT - 1)
+    _touch(pipe, run_id)
+    pipe.execute()
+    return run_id
+
+def get_run(run_id: str) -> Dict[str, str]:
+    return sync_redis_client.hgetall(run_key(run_id))
+
+def get_current_run() -> Optional[Dict[str, str]]:
+    """Get the unfinished run, if there is one"""
+    run_id = sync_redis_client.get(CURRENT_RUN_KEY)
+    run = get_run(run_id) if run_id else None
+    return run if run and run.get("stage") != STAGE_DONE else None
+
+def is_stale(run: Dict[str, str]) -> bool:
+    """Check whether a run has made no progress for INGEST_RUN_STALE_SECONDS"""
+    return time.time() - float(run.get("updated_at", 0)) > settings.INGEST_RUN_STALE_SECONDS
+
+def set_stage(run_id: str, stage: str, **fields: Any):
+    pipe = sync_redis_client.pipeline(transaction=False)
+    pipe.hset(run_key(run_id), mapping={"stage": stage, f"{stage}_at": time.time(), **fields})
+    _touch(pipe, run_id)
+    if stage == STAGE_DONE:
+        pipe.delete(CURRENT_RUN_KEY)
+    pipe.execute()
+
+def get_shard(run_id: str, shard: int) -> Dict[str, str]:
+    return sync_redis_client.hgetall(shard_key(run_id, shard))
+
+def unfinished_shards(run_id: str) -> List[int]:
+    """Get the shards of a run that have not completed"""
+    count = int(get_run(run_id).get("shards", 0))
+    pipe = sync_redis_client.pipeline(transaction=False)
+    for shard in range(count):
+        pipe.hget(shard_key(run_id, shard), "status")
+    return [shard for shard, status in enumerate(pipe.execute()) if status != SHARD_DONE]
+
+def set_shard_job(run_id: str, shard: int, job_id: str):
+    sync_redis_client.hset(shard_key(run_id, shard), "job_id", job_id)
+
+async def run_lineups_stage(db: Session, run_id: str) -> int:
+    """Refresh every lineup once, then plan and record the schedule shards; returns the shard count"""
+    lineup_coverage = get_lineup_coverage(db)
+    preferred = get_ready_accounts(db, lineup_coverage)
+    failed: Set[str] = set()
+
+    lineup_stats = await sync_planned_lineups(db, lineup_coverage, preferred, failed)
+    shards = plan_station_shards(
+        get_station_coverage(db, lineup_coverage), preferred, failed, settings.INGEST_SHARD_STATIONS
+    )
+
+    now = time.time()
+    keys = []
+    pipe = sync_redis_client.pipeline(transaction=True)
+    for shard, (user_id, station_ids) in enumerate(shards):
+        keys.append(shard_key(run_id, shard))
+        pipe.delete(keys[-1])
+        pipe.hset(keys[-1], mapping={
+            "user_id": user_id,
+            "stations": json.dumps(station_ids),
+            "total": len(station_ids),
+            "done": 0,
+            "rows": 0,
+            "station_days_changed": 0,
+            "status": SHARD_PENDING,
+            "created_at": now,
+        })
+    pipe.hset(run_key(run_id), mapping={
+        "stage": STAGE_SCHEDULES,
+        f"{STAGE_SCHEDULES}_at": now,
+        "shards": len(shards),
+        "stations": sum(len(station_ids) for _, station_ids in shards),
+        "changed_lineups": json.dumps(lineup_stats["changed_lineups"]),
+        "token_user": lineup_stats["accounts"][0] if lineup_stats["accounts"] else "",
+    })
+    _touch(pipe, run_id, *keys)
+    pipe.execute()
+
+    logger.info(f"Ingest run {run_id}: {len(shards)} schedule shards planned")
+    return len(shards)
+
+async def run_schedule_shard(db: Session, run_id: str, shard: int) -> Dict[str, Any]:
+    """Fetch a shard's schedules, checkpointing after every INGEST_CHECKPOINT_STATIONS stations.
+
+    A retried or resumed shard starts after its last checkpoint.
+    """
+    key = shard_key(run_id, shard)
+    state = get_shard(run_id, shard)
+    if not state or state.get("status") == SHARD_DONE:
+        return state
+
+    days = int(get_run(run_id).get("days", 14))
+    station_ids = json.loads(state["stations"])
+    done = int(state.get("done", 0))
+    sync_redis_client.hset(key, mapping={
+        "status": SHARD_RUNNING, "started_at": state.get("started_at") or time.time(),
+    })
+
+    try:
+        user_id, token = await get_planned_token(db, state["user_id"], station_ids[done:], set())
+        client = get_sd_client()
+        while done < len(station_ids):
+            batch = station_ids[done:done + settings.INGEST_CHECKPOINT_STATIONS]
+            stats = await sync_schedules(db, client, token, batch, days)
+            done += len(batch)
+
+            pipe = sync_redis_client.pipeline(transaction=True)
+            if stats["program_md5s"]:
+                pipe.hset(program_md5s_key(run_id), mapping=stats["program_md5s"])
+            if stats["changed_station_days"]:
+                pipe.sadd(changed_key(run_id), *(f"{s}|{d}" for s, d in stats["changed_station_days"]))
+            # Recorded in the database by the programs stage, once the programs are stored
+            if stats["schedule_md5s"]:
+                pipe.hset(schedule_md5s_key(run_id), mapping={
+                    f"{row['station_id']}|{row['date'].isoformat()}": json.dumps({
+                        "md5": row["md5"],
+                        "last_modified": row["last_modified"].isoformat() if row["last_modified"] else None,
+                    })
+                    for row in stats["schedule_md5s"]
+                })
+            pipe.hset(key, mapping={"done": done, "updated_at": time.time()})
+            pipe.hincrby(key, "rows", stats["airings"])
+            pipe.hincrby(key, "station_days_changed", stats["station_days_changed"])
+            pipe.hset(run_key(run_id), "token_user", user_id)
+            _touch(pipe, run_id, key, program_md5s_key(run_id), changed_key(run_id), schedule_md5s_key(run_id))
+            pipe.execute()
+    except Exception:
+        sync_redis_client.hset(key, mapping={"status": SHARD_FAILED, "updated_at": time.time()})
+        raise
+
+    sync_redis_client.hset(key, mapping={"status": SHARD_DONE, "updated_at": time.time()})
+    return get_shard(run_id, shard)
+
+async def _run_token(db: Session, run_id: str) -> Optional[str]:
+    """Get a token for account-independent stages (programs, images)"""
+    user_id = get_run(run_id).get("token_user")
+    if not user_id:
+        return None
+    _, token = await get_planned_token(db, user_id, [], set())
+    return token
+
+def _store_run_schedule_md5s(db: Session, run_id: str) -> int:
+    """Record the schedule MD5s the run's shards collected, completing those station-days"""
+    rows = []
+    for member, value in sync_redis_client.hgetall(schedule_md5s_key(run_id)).items():
+        station_id, day = member.split("|", 1)
+        data = json.loads(value)
+        rows.append({
+            "station_id": station_id,
+            "date": date.fromisoformat(day),
+            "md5": data["md5"],
+            "last_modified": datetime.fromisoformat(data["last_modified"]) if data["last_modified"] else None,
+        })
+    store_schedule_md5s(db, rows)
+    return len(rows)
+
+async def run_programs_stage(db: Session, run_id: str) -> Dict[str, Any]:
+    """Fetch programs new or changed in the run's schedules, then record the schedule MD5s"""
+    set_stage(run_id, STAGE_PROGRAMS)
+    program_md5s = sync_redis_client.hgetall(program_md5s_key(run_id))
+    stats: Dict[str, Any] = {"programs_fetched": 0}
+    if program_md5s:
+        token = await _run_token(db, run_id)
+        if token is None:
+            raise ValueError(f"Ingest run {run_id} has no SD account to fetch programs with")
+
+        # Incremental against stored MD5s, so a rerun only fetches what is still missing
+        stats = await sync_programs(db, get_sd_client(), token, program_md5s)
+        fetched = stats.pop("fetched_program_ids")
+        pipe = sync_redis_client.pipeline(transaction=False)
+        if fetched:
+            pipe.sadd(fetched_key(run_id), *fetched)
+        pipe.hincrby(run_key(run_id), "programs_fetched", stats["programs_fetched"])
+        _touch(pipe, run_id, fetched_key(run_id))
+        pipe.execute()
+
+    stats["schedule_md5s"] = _store_run_schedule_md5s(db, run_id)
+    return stats
+
+async def run_images_stage(db: Session, run_id: str) -> Dict[str, Any]:
+    """Fetch artwork for the programs the run fetched"""
+    set_stage(run_id, STAGE_IMAGES)
+    program_ids = sorted(sync_redis_client.smembers(fetched_key(run_id)))
+    token = await _run_token(db, run_id) if program_ids else None
+    if token is None:
+        return {"images": 0}
+
+    stats = await sync_images(db, get_sd_client(), token, program_ids)
+    sync_redis_client.hset(run_key(run_id), "images", stats["images"])
+    return stats
+
+def finish_run(run_id: str) -> Dict[str, Any]:
+    """Mark a run done and collect what it changed for the follow-up jobs"""
+    run = get_run(run_id)
+    changed = sorted(
+        tuple(member.split("|", 1)) for member in sync_redis_client.smembers(changed_key(run_id))
+    )
+    failed = [
+        shard for shard in unfinished_shards(run_id)
+        if get_shard(run_id, shard).get("status") == SHARD_FAILED
+    ]
+    set_stage(run_id, STAGE_DONE, failed_shards=len(failed))
+    logger.info(
+        f"Ingest run {run_id} finished: {len(changed)} station-days changed, "
+        f"{len(failed)} of {run.get('shards', 0)} shards failed"
+    )
+    return {
+        "run_id": run_id,
+        "changed_station_days": changed,
+        "changed_lineups": json.loads(run.get("changed_lineups") or "[]"),
+        "fetched_program_ids": sorted(sync_redis_client.smembers(fetched_key(run_id))),
+        "failed_shards": failed,
+    }
+
+def summarize_progress(state: Dict[str, str], now: float) -> Dict[str, Any]:
+    """Get completion, throughput and ETA from a shard's (or run's) counters"""
+    total = int(state.get("total", 0))
+    done = int(state.get("done", 0))
+    rows = int(state.get("rows", 0))
+    started = float(state.get("started_at") or 0)
+    ended = float(state.get("updated_at") or now) if state.get("status") in (SHARD_DONE, SHARD_FAILED) else now
+    elapsed = max(ended - started, 0.0) if started else 0.0
+
+    eta = None
+    if total and done >= total:
+        eta = 0
+    elif done:
+        eta = round(elapsed * (total - done) / done)
+
+    return {
+        "stations_total": total,
+        "stations_done": done,
+        "percent": round(100.0 * done / total, 1) if total else 100.0,
+        "rows": rows,
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+        "elapsed_seconds": round(elapsed),
+        "eta_seconds": eta,
+    }
+
+async def get_ingest_progress(limit: int = 5) -> List[Dict[str, Any]]:
+    """Get the most recent runs with per-shard progress, rows/sec and ETA"""
+    now = time.time()
+    run_ids = await redis_client.lrange(RECENT_RUNS_KEY, 0, limit - 1)
+    runs = []
+    for run_id in run_ids:
+        run = await redis_client.hgetall(run_key(run_id))
+        if not run:
+            continue
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for shard in range(int(run.get("shards", 0))):
+                pipe.hgetall(shard_key(run_id, shard))
+            shard_states = await pipe.execute()
+
+        shards = []
+        for shard, state in enumerate(shard_states):
+            shards.append({
+                "shard": shard,
+                "status": state.get("status"),
+                "job_id": state.get("job_id"),
+                "station_days_changed": int(state.get("station_days_changed", 0)),
+                **summarize_progress(state, now),
+            })
+
+        # The run's schedule stage, as if it were one shard spanning all of them
+        started = [float(state["started_at"]) for state in shard_states if state.get("started_at")]
+        totals = {
+            "total": sum(int(state.get("total", 0)) for state in shard_states),
+            "done": sum(int(state.get("done", 0)) for state in shard_states),
+            "rows": sum(int(state.get("rows", 0)) for state in shard_states),
+            "started_at": min(started) if started else 0,
+            "updated_at": run.get(f"{STAGE_PROGRAMS}_at") or run.get("updated_at"),
+            "status": SHARD_DONE if run.get("stage") not in (STAGE_LINEUPS, STAGE_SCHEDULES) else SHARD_RUNNING,
+        }
+        runs.append({
+            "run_id": run_id,
+            "stage": run.get("stage"),
+            "days": int(run.get("days", 0)),
+            "created_at": float(run.get("created_at", 0)),
+            "updated_at": float(run.get("updated_at", 0)),
+            "programs_fetched": int(run.get("programs_fetched", 0)),
+            "images": int(run.get("images", 0)),
+            "failed_shards": int(run.get("failed_shards", 0)),
+            "schedules": summarize_progress(totals, now),
+            "shards": shards,
+        })
+    return runs
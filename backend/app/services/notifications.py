@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.core import User, Program, Station
+from app.models.user_data import Notification
+from app.services.mailer import DELIVERY_REJECTED
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_SUPPRESSED = "suppressed"
+STATUS_SENDING = "sending"
+STATUS_FAILED = "failed"
+
+def idempotency_key(user_id: str, rule_id: str, station_id: str, program_id: str, start_utc: datetime) -> str:
+    """Identify one alert for one airing; matching the same airing again is a no-op"""
+    raw = f"{user_id}|{rule_id}|{station_id}|{program_id}|{int(start_utc.timestamp())}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+def record_rule_matches(db: Session, matches: List[Dict[str, Any]]) -> Set[str]:
+    """Insert pending notifications for rule matches, one statement per batch.
+
+    Matches already recorded (by this or an earlier ingest) are skipped by the
+    unique idempotency key, so re-running a job never duplicates alerts.
+    Returns the users who got new notifications.
+    """
+    now = datetime.now(timezone.utc)
+    rows: Dict[str, Dict[str, Any]] = {}
+    for match in matches:
+        start_utc = datetime.fromisoformat(match["start_utc"])
+        key = idempotency_key(
+            match["user_id"], match["rule_id"], match["station_id"], match["program_id"], start_utc
+        )
+        rows[key] = {
+            "id": uuid.uuid4(),
+            "user_id": uuid.UUID(match["user_id"]),
+            "rule_id": uuid.UUID(match["rule_id"]),
+            "station_id": match["station_id"],
+            "program_id": match["program_id"],
+            "start_utc": start_utc,
+            "status": STATUS_PENDING,
+            "idempotency_key": key,
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    batch = list(rows.values())
+    created = 0
+    users: Set[str] = set()
+    for start in range(0, len(batch), settings.NOTIFY_BATCH_SIZE):
+        stmt = insert(Notification).values(batch[start:start + settings.NOTIFY_BATCH_SIZE])
+        result = db.execute(
+            stmt.on_conflict_do_nothing(index_elements=["idempotency_key"]).returning(Notification.user_id)
+        )
+        for (user_id,) in result:
+            users.add(str(user_id))
+            created += 1
+    db.commit()
+
+    logger.info(f"Created {created} notifications for {len(users)} users from {len(matches)} rule matches")
+    return users
+
+def _set_status(db: Session, ids: List[uuid.UUID], status: str, now: datetime, **values: Any):
+    for start in range(0, len(ids), settings.NOTIFY_BATCH_SIZE):
+        db.execute(
+            update(Notification)
+            .where(Notification.id.in_(ids[start:start + settings.NOTIFY_BATCH_SIZE]))
+            .values(status=status, updated_at=now, **values)
+        )
+
+def _claim(db: Session, now: datetime, limit: int) -> List[Any]:
+    """Claim due notifications by marking them sending, then commit so no row locks are held while sending.
+
+    Rows left sending longer than NOTIFY_SEND_LEASE_SECONDS belong to a
+    dispatcher that died mid-send and are claimed again.
+    """
+    lease_expired = now - timedelta(seconds=settings.NOTIFY_SEND_LEASE_SECONDS)
+    rows = db.execute(
+        select(
+            Notification.id,
+            Notification.user_id,
+            Notification.rule_id,
+            Notification.station_id,
+            Notification.program_id,
+            Notification.start_utc,
+            Notification.attempts,
+        )
+        .where(or_(
+            and_(
+                Notification.status == STATUS_PENDING,
+                or_(Notification.next_attempt_at.is_(None), Notification.next_attempt_at <= now)
+            ),
+            and_(Notification.status == STATUS_SENDING, Notification.updated_at < lease_expired)
+        ))
+        .order_by(Notification.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    _set_status(db, [row.id for row in rows], STATUS_SENDING, now)
+    db.commit()
+    return rows
+
+def _retry_later(db: Session, rows: List[Any], now: datetime) -> Tuple[int, int]:
+    """Put rows back to pending with exponential backoff, or fail them once out of attempts"""
+    failed: List[uuid.UUID] = []
+    by_attempts: Dict[int, List[uuid.UUID]] = {}
+    for row in rows:
+        attempts = (row.attempts or 0) + 1
+        if attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+            failed.append(row.id)
+        else:
+            by_attempts.setdefault(attempts, []).append(row.id)
+
+    for attempts, ids in by_attempts.items():
+        delay = settings.NOTIFY_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        _set_status(
+            db, ids, STATUS_PENDING, now,
+            attempts=attempts, next_attempt_at=now + timedelta(seconds=delay)
+        )
+    _set_status(db, failed, STATUS_FAILED, now, attempts=settings.NOTIFY_MAX_ATTEMPTS)
+    return sum(len(ids) for ids in by_attempts.values()), len(failed)
+
+def dispatch_digests(
+    db: Session,
+    deliver: Optional[Callable[[List[Dict[str, Any]]], Dict[str, str]]] = None,
+    limit: Optional[int] = None
+) -> Tuple[List[Dict[str, Any]], int, int]:
+    """Claim a batch of due notifications and coalesce them into one digest per user.
+
+    An airing that has already started, or that belongs to an inactive user,
+    is suppressed. So is a second match of the same airing by another of
+    the user's rules. Everything else goes into the user's digest. Rows are
+    claimed with SKIP LOCKED and marked sending before delivery, so
+    concurrent dispatchers never share work and no locks are held during
+    SMTP I/O. If `deliver` is given it is called with the digests and
+    returns an outcome for each user whose digest failed: rejected digests
+    are marked failed, others are retried with backoff up to
+    NOTIFY_MAX_ATTEMPTS. Returns (digests delivered, rows claimed, rows
+    scheduled for retry).
+    """
+    now = datetime.now(timezone.utc)
+    pending = _claim(db, now, limit or settings.NOTIFY_BATCH_SIZE)
+    if not pending:
+        return [], 0, 0
+
+    user_ids = {row.user_id for row in pending}
+    users = {
+        user_id: email for user_id, email in db.execute(
+            select(User.id, User.email).where(User.id.in_(user_ids), User.is_active.is_(True))
+        )
+    }
+    titles = dict(db.execute(
+        select(Program.program_id, Program.title).where(Program.program_id.in_({row.program_id for row in pending}))
+    ).all())
+    callsigns = dict(db.execute(
+        select(Station.id, Station.callsign).where(Station.id.in_({row.station_id for row in pending}))
+    ).all())
+
+    sent: List[uuid.UUID] = []
+    suppressed: List[uuid.UUID] = []
+    digests: Dict[uuid.UUID, Dict[str, Any]] = {}
+    seen: Set[Tuple[uuid.UUID, str, str, datetime]] = set()
+
+    for row in pending:
+        airing = (row.user_id, row.station_id, row.program_id, row.start_utc)
+        if row.user_id not in users or row.start_utc is None or row.start_utc <= now or airing in seen:
+            suppressed.append(row.id)
+            continue
+        seen.add(airing)
+        sent.append(row.id)
+
+        digest = digests.setdefault(row.user_id, {"user_id": str(row.user_id), "email": users[row.user_id], "items": []})
+        digest["items"].append({
+            "notification_id": str(row.id),
+            "rule_id": str(row.rule_id) if row.rule_id else None,
+            "program_id": row.program_id,
+            "title": titles.get(row.program_id, row.program_id),
+            "station_id": row.station_id,
+            "callsign": callsigns.get(row.station_id),
+            "start_utc": row.start_utc.isoformat(),
+        })
+
+    for digest in digests.values():
+        digest["items"].sort(key=lambda item: item["start_utc"])
+
+    retry_rows: List[Any] = []
+    rejected: List[uuid.UUID] = []
+    if deliver is not None and digests:
+        # Don't sit idle in a transaction during SMTP I/O
+        db.commit()
+        failures = deliver(list(digests.values()))
+        if failures:
+            rows_by_id = {row.id: row for row in pending}
+            for user_id, outcome in failures.items():
+                ids = [uuid.UUID(item["notification_id"]) for item in digests.pop(uuid.UUID(user_id))["items"]]
+                if outcome == DELIVERY_REJECTED:
+                    rejected.extend(ids)
+                else:
+                    retry_rows.extend(rows_by_id[notification_id] for notification_id in ids)
+            unsent = set(rejected) | {row.id for row in retry_rows}
+            sent = [notification_id for notification_id in sent if notification_id not in unsent]
+
+    now = datetime.now(timezone.utc)
+    _set_status(db, sent, STATUS_SENT, now)
+    _set_status(db, suppressed, STATUS_SUPPRESSED, now)
+    _set_status(db, rejected, STATUS_FAILED, now)
+    retried, exhausted = _retry_later(db, retry_rows, now)
+    db.commit()
+
+    logger.info(
+        f"Dispatched {len(sent)} notifications in {len(digests)} digests, suppressed {len(suppressed)}, "
+        f"rejected {len(rejected)}, retrying {retried}, gave up on {exhausted}"
+    )
+    return list(digests.values()), len(pending), retried
+
+def next_retry_at(db: Session) -> Optional[datetime]:
+    """Get when the earliest notification waiting out a retry backoff becomes due"""
+    return db.execute(
+        select(func.min(Notification.next_attempt_at)).where(Notification.status == STATUS_PENDING)
+    ).scalar()
@@ -0,0 +1,95 @@
+import os
+import uuid
+from typing import Iterator, Optional
+from urllib.parse import urlparse, unquote
+
+import aiofiles
+
+from app.core.config import settings
+
+class FileObjectStore:
+    """Object store on a local or shared filesystem (file:// URIs).
+
+    Keys are slash-separated paths under the root. Writes go to a temporary
+    file that is renamed into place, so readers never see a partial object.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def _temp_path(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{uuid.uuid4().hex}.tmp"
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        tmp_path = self._temp_path(path)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str):
+        path = self._path(key)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            return
+        try:
+            # Tidy up the key's directory once it is empty
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+    def list(self, prefix: str) -> Iterator[str]:
+        """Get every key under a prefix"""
+        base = self._path(prefix)
+        for directory, _, files in os.walk(base):
+            for name in files:
+                if not name.endswith(".tmp"):
+                    yield os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        try:
+            async with aiofiles.open(self._path(key), "rb") as f:
+                return await f.read()
+        except FileNotFoundError:
+            return None
+
+    async def aput(self, key: str, data: bytes):
+        path = self._path(key)
+        tmp_path = self._temp_path(path)
+        async with aiofiles.open(tmp_path, "wb") as f:
+            await f.write(data)
+        os.replace(tmp_path, path)
+
+def create_object_store(uri: str) -> FileObjectStore:
+    """Create an object store for a storage URI"""
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        return FileObjectStore(unquote(parsed.path))
+    raise ValueError(f"Unsupported object storage URI: {uri}")
+
+_store: Optional[FileObjectStore] = None
+
+def get_object_store() -> FileObjectStore:
+    """Get the process-wide store for OBJECT_STORAGE_URI"""
+    global _store
+    if _store is None:
+        _store = create_object_store(settings.OBJECT_STORAGE_URI)
+    return _store
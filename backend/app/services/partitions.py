@@ -0,0 +1,80 @@
+import logging
+import re
+from typing import Any, Dict, List
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# schedules is range-partitioned by day on start_utc; one child table per UTC day
+PARTITION_PATTERN = re.compile(r"^schedules_p(\d{8})$")
+
+def partition_name(day: date) -> str:
+    return f"schedules_p{day:%Y%m%d}"
+
+def list_schedule_partitions(db: Session) -> Dict[date, str]:
+    """Get the existing schedules partitions by day"""
+    rows = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'schedules'::regclass"
+    ))
+    partitions = {}
+    for (name,) in rows:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return partitions
+
+def ensure_schedule_partitions(db: Session, first_day: date, last_day: date) -> List[str]:
+    """Create any missing daily partitions for [first_day, last_day]; the caller commits"""
+    existing = list_schedule_partitions(db)
+    created = []
+    day = first_day
+    while day <= last_day:
+        if day not in existing:
+            name = partition_name(day)
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF schedules "
+                f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') "
+                f"TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')"
+            ))
+            created.append(name)
+        day += timedelta(days=1)
+
+    if created:
+        logger.info(f"Created schedule partitions {created[0]}..{created[-1]} ({len(created)})")
+    return created
+
+def drop_expired_schedule_partitions(db: Session, retention_days: int) -> List[str]:
+    """Drop whole partitions older than the retention window; the caller commits.
+
+    Dropping a partition removes a day of airings without a DELETE, so there
+    are no dead tuples left for VACUUM.
+    """
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+    dropped = []
+    for day, name in sorted(list_schedule_partitions(db).items()):
+        if day >= cutoff:
+            break
+        db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        dropped.append(name)
+
+    # MD5s for dropped days would otherwise make a re-ingest skip them
+    db.execute(text("DELETE FROM schedule_md5s WHERE date < :cutoff"), {"cutoff": cutoff})
+
+    if dropped:
+        logger.info(f"Dropped expired schedule partitions {dropped[0]}..{dropped[-1]} ({len(dropped)})")
+    return dropped
+
+def maintain_schedule_partitions(db: Session) -> Dict[str, Any]:
+    """Create partitions ahead of ingest and drop those past retention"""
+    today = datetime.now(timezone.utc).date()
+    created = ensure_schedule_partitions(db, today, today + timedelta(days=settings.SCHEDULE_PARTITION_PREMAKE_DAYS))
+    dropped = drop_expired_schedule_partitions(db, settings.SCHEDULE_RETENTION_DAYS)
+    db.commit()
+    return {"created": created, "dropped": dropped}
@@ -0,0 +1,224 @@
+import logging
+from collections import deque
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from app.models.core import Schedule, Program
+from app.models.user_data import Rule, RuleType
+from app.services.suggest import normalize
+
+logger = logging.getLogger(__name__)
+
+class WordAutomaton:
+    """Aho-Corasick automaton over words, matching many phrases in one pass.
+
+    Patterns and text are sequences of normalized words, so a phrase only
+    matches on word boundaries ("cup" does not match "cupcake"). Using
+    words rather than characters as the alphabet keeps the automaton small
+    enough for every active rule in the system.
+    """
+
+    def __init__(self):
+        self._goto: Dict[Tuple[int, str], int] = {}
+        self._children: List[List[str]] = [[]]
+        self._fail: List[int] = [0]
+        self._output_link: List[int] = [0]
+        self._values: List[List[Any]] = [[]]
+
+    def add(self, words: List[str], value: Any):
+        """Add a phrase; call build() after the last one"""
+        state = 0
+        for word in words:
+            next_state = self._goto.get((state, word))
+            if next_state is None:
+                next_state = len(self._children)
+                self._goto[(state, word)] = next_state
+                self._children[state].append(word)
+                self._children.append([])
+                self._fail.append(0)
+                self._output_link.append(0)
+                self._values.append([])
+            state = next_state
+        self._values[state].append(value)
+
+    def build(self):
+        """Compute failure and output links breadth-first"""
+        queue = deque(self._goto[(0, word)] for word in self._children[0])
+        while queue:
+            state = queue.popleft()
+            for word in self._children[state]:
+                child = self._goto[(state, word)]
+                fallback = self._fail[state]
+                while fallback and (fallback, word) not in self._goto:
+                    fallback = self._fail[fallback]
+                target = self._goto.get((fallback, word), 0)
+                self._fail[child] = target if target != child else 0
+                # Nearest state on the failure chain that ends a phrase
+                self._output_link[child] = target if self._values[target] else self._output_link[target]
+                queue.append(child)
+
+    def search(self, words: Iterable[str]) -> List[Any]:
+        """Get the values of every phrase occurring in the text"""
+        found = []
+        state = 0
+        for word in words:
+            while state and (state, word) not in self._goto:
+                state = self._fail[state]
+            state = self._goto.get((state, word), 0)
+            match = state if self._values[state] else self._output_link[state]
+            while match:
+                found.extend(self._values[match])
+                match = self._output_link[match]
+        return found
+
+class CompiledRule:
+    """The parts of a rule needed to accept or reject a candidate airing"""
+
+    __slots__ = ("id", "user_id", "station_ids", "new_only")
+
+    def __init__(self, rule: Rule):
+        self.id = rule.id
+        self.user_id = rule.user_id
+        self.station_ids: Optional[FrozenSet[str]] = frozenset(rule.station_ids) if rule.station_ids else None
+        self.new_only = bool(rule.new_only)
+
+    def accepts(self, station_id: str, is_new: bool) -> bool:
+        if self.station_ids is not None and station_id not in self.station_ids:
+            return False
+        return is_new or not self.new_only
+
+def series_key(program_id: str) -> str:
+    """Get the series a program belongs to (EP/SH IDs share their 8-digit series number)"""
+    if program_id[:2] in ("EP", "SH"):
+        return "SH" + program_id[2:10]
+    return program_id
+
+class RuleMatcher:
+    """Every active rule compiled into shared lookup structures.
+
+    Series rules become one hash lookup per airing. Keyword rules (title,
+    episode title, description) and team rules (title, episode title) each
+    become one automaton, so a candidate airing costs the same however many
+    rules exist.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.series: Dict[str, List[CompiledRule]] = {}
+        self.keywords = WordAutomaton()
+        self.teams = WordAutomaton()
+        self.rule_count = 0
+
+        for rule in rules:
+            compiled = CompiledRule(rule)
+            if rule.type == RuleType.SERIES and rule.program_id:
+                self.series.setdefault(series_key(rule.program_id), []).append(compiled)
+            elif rule.type in (RuleType.KEYWORD, RuleType.TEAM) and rule.query:
+                words = normalize(rule.query).split()
+                if not words:
+                    continue
+                automaton = self.keywords if rule.type == RuleType.KEYWORD else self.teams
+                automaton.add(words, compiled)
+            else:
+                continue
+            self.rule_count += 1
+
+        self.keywords.build()
+        self.teams.build()
+
+    def match(
+        self,
+        station_id: str,
+        program_id: str,
+        is_new: bool,
+        title: Optional[str],
+        episode_title: Optional[str],
+        description: Optional[str]
+    ) -> List[CompiledRule]:
+        """Get the rules an airing satisfies, each at most once"""
+        candidates = list(self.series.get(series_key(program_id), ()))
+
+        # Fields are searched separately so a phrase can't straddle two of them
+        for field in (title, episode_title):
+            words = normalize(field or "").split()
+            candidates.extend(self.teams.search(words))
+            candidates.extend(self.keywords.search(words))
+        candidates.extend(self.keywords.search(normalize(description or "").split()))
+
+        matched: Dict[Any, CompiledRule] = {}
+        for rule in candidates:
+            if rule.id not in matched and rule.accepts(station_id, is_new):
+                matched[rule.id] = rule
+        return list(matched.values())
+
+# One compiled matcher per process, rebuilt when the active rule set changes
+_matcher: Optional[RuleMatcher] = None
+_matcher_signature: Optional[Tuple] = None
+
+def get_rule_matcher(db: Session) -> RuleMatcher:
+    """Get the compiled matcher, recompiling only if rules were added, changed or removed"""
+    global _matcher, _matcher_signature
+
+    signature = tuple(db.execute(
+        select(func.count(Rule.id), func.max(Rule.updated_at), func.max(Rule.created_at)).where(Rule.is_active.is_(True))
+    ).one())
+    if _matcher is None or signature != _matcher_signature:
+        rules = db.execute(select(Rule).where(Rule.is_active.is_(True))).scalars()
+        _matcher = RuleMatcher(rules)
+        _matcher_signature = signature
+        logger.info(f"Compiled {_matcher.rule_count} active rules")
+    return _matcher
+
+def find_rule_matches(db: Session, station_days: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Match active rules against upcoming airings in the given (changed) station-days"""
+    matcher = get_rule_matcher(db)
+    if not matcher.rule_count or not station_days:
+        return []
+
+    stations_by_day: Dict[date, Set[str]] = {}
+    for station_id, day in station_days:
+        stations_by_day.setdefault(date.fromisoformat(str(day)), set()).add(station_id)
+
+    now = datetime.now(timezone.utc)
+    matches = []
+    scanned = 0
+
+    # One query per day keeps each scan inside a single schedules partition
+    for day, station_ids in sorted(stations_by_day.items()):
+        day_start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        if day_start + timedelta(days=1) <= now:
+            continue
+
+        stmt = (
+            select(
+                Schedule.station_id,
+                Schedule.program_id,
+                Schedule.start_utc,
+                Schedule.is_new,
+                Program.title,
+                Program.episode_title,
+                Program.description,
+            )
+            .join(Program, Program.program_id == Schedule.program_id)
+            .where(
+                Schedule.station_id.in_(station_ids),
+                Schedule.start_utc >= max(day_start, now),
+                Schedule.start_utc < day_start + timedelta(days=1)
+            )
+            .execution_options(yield_per=5000)
+        )
+        for station_id, program_id, start_utc, is_new, title, episode_title, description in db.execute(stmt):
+            scanned += 1
+            for rule in matcher.match(station_id, program_id, bool(is_new), title, episode_title, description):
+                matches.append({
+                    "rule_id": str(rule.id),
+                    "user_id": str(rule.user_id),
+                    "station_id": station_id,
+                    "program_id": program_id,
+                    "start_utc": start_utc.isoformat(),
+                })
+
+    logger.info(f"Matched {len(matches)} airings from {scanned} scanned against {matcher.rule_count} rules")
+    return matches
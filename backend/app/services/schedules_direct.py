@@ -1,22 +1,155 @@
 import httpx
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator, Awaitable, Callable, Iterator, Tuple
 from datetime import datetime, timedelta, timezone
 import hashlib
-import gzip
 import json
 
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.services.sd_governor import SDRateGovernor, get_sd_governor
+
 logger = logging.getLogger(__name__)
 
+# Maximum IDs SD accepts in a single batch request
+MAX_PROGRAMS_PER_REQUEST = 5000
+MAX_STATIONS_PER_REQUEST = 5000
+MAX_IMAGES_PER_REQUEST = 500
+
+# Parsed items buffered between chunk streams and the consumer
+STREAM_QUEUE_SIZE = 256
+
+# Smallest amount of new text to wait for before re-trying an incomplete item
+MIN_STREAM_RETRY_CHARS = 16 * 1024
+
+class JSONArrayStreamParser:
+    """Incrementally parse the items of a top-level JSON array fed in text chunks.
+    
+    Only the text of the item currently being received is buffered, so memory
+    stays proportional to the largest item rather than the whole response. A
+    top-level object (e.g. an SD error payload) is buffered and returned whole.
+    """
+    
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._is_array = True
+        self._finished = False
+        # Buffer length required before re-attempting an incomplete item
+        self._retry_at = 0
+    
+    def feed(self, text: str) -> List[Any]:
+        """Add text and return any items that are now complete"""
+        self._buffer += text
+        if self._finished or not self._is_array or len(self._buffer) < self._retry_at:
+            return []
+        return self._drain(final=False)
+    
+    def close(self) -> List[Any]:
+        """Return remaining items once the stream has ended"""
+        if not self._is_array:
+            return [json.loads(self._buffer)] if self._buffer.strip() else []
+        items = self._drain(final=True)
+        if not self._finished and self._started:
+            raise ValueError("Truncated JSON array in response")
+        return items
+    
+    def _drain(self, final: bool) -> List[Any]:
+        buffer = self._buffer
+        pos = 0
+        items = []
+        self._retry_at = 0
+        
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            
+            if not self._started:
+                self._started = True
+                if buffer[pos] != "[":
+                    self._is_array = False
+                    break
+                pos += 1
+                continue
+            
+            if buffer[pos] == "]":
+                self._finished = True
+                pos += 1
+                break
+            
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # Wait for the item to grow substantially before parsing it again
+                pending = len(buffer) - pos
+                self._retry_at = pending + max(pending, MIN_STREAM_RETRY_CHARS)
+                break
+            
+            # A scalar is only complete once a delimiter follows it: "12" may become "123", "1." "1.5"
+            if not final and not isinstance(item, (dict, list)):
+                if end == len(buffer) or buffer[end] not in " \t\r\n,]":
+                    break
+            
+            items.append(item)
+            pos = end
+        
+        self._buffer = buffer[pos:] if self._is_array else buffer
+        return items
+
+class _ChunkFailed:
+    """Carries a chunk's exception through the item queue"""
+    
+    def __init__(self, error: Exception):
+        self.error = error
+
+_CHUNK_DONE = object()
+
+def hash_sd_password(password: str) -> str:
+    """Hash a password as required by SD API"""
+    return hashlib.sha1(password.encode()).hexdigest()
+
+def _token_scope(token: str) -> str:
+    """Identify an account's cached responses without putting its token in Redis keys"""
+    return hashlib.sha1(token.encode()).hexdigest()
+
+def _chunks(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Split a list into consecutive chunks of at most `size` items"""
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
 class SchedulesDirectClient:
     """Client for Schedules Direct JSON API"""
     
-    def __init__(self, base_url: str, app_id: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: str,
+        app_id: Optional[str] = None,
+        max_concurrency: int = 4,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+        timeout: float = 30.0,
+        governor: Optional[SDRateGovernor] = None,
+        cache_ttls: Optional[Dict[str, int]] = None
+    ):
         self.base_url = base_url.rstrip('/')
         self.app_id = app_id or "sd-browser"
+        # Bounds in-flight batch chunks so a large lineup can't flood SD
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Shared request budget; every HTTP call to SD takes a token first
+        self.governor = governor
+        # Seconds to share read-only responses through Redis, by endpoint name
+        self.cache_ttls = cache_ttls or {}
+        self._inflight: Dict[str, asyncio.Task] = {}
         self.session = httpx.AsyncClient(
-            timeout=30.0,
+            timeout=timeout,
+            limits=limits or httpx.Limits(),
+            http2=http2,
             headers={
                 "User-Agent": f"{self.app_id}/1.0",
                 "Accept": "application/json",
@@ -28,19 +161,74 @@ class SchedulesDirectClient:
         """Close the HTTP session"""
         await self.session.aclose()
     
+    async def _acquire(self):
+        if self.governor is not None:
+            await self.governor.acquire()
+    
+    async def _rate_limited(self, response: httpx.Response):
+        """Pause for SD's Retry-After; with a governor the whole fleet pauses"""
+        retry_after = int(response.headers.get("Retry-After", 60))
+        if self.governor is not None:
+            # The next acquire waits out the pause
+            await self.governor.pause(retry_after)
+        else:
+            logger.warning(f"Rate limited, waiting {retry_after}s")
+            await asyncio.sleep(retry_after)
+    
+    async def _cached(
+        self,
+        endpoint: str,
+        scope: str,
+        fetch: Callable[[], Awaitable[Any]],
+        flight_scope: Optional[str] = None
+    ) -> Any:
+        """Share one response between identical calls.
+        
+        Concurrent callers in this process await a single in-flight request,
+        and with a TTL configured for the endpoint the result is also cached
+        in Redis for every other process. A `flight_scope` narrows who shares
+        the in-flight request (and so its errors) without narrowing the cache.
+        """
+        cache_key = f"sd:cache:{endpoint}:{scope}"
+        flight_key = f"{cache_key}:{flight_scope}" if flight_scope else cache_key
+        task = self._inflight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_or_fetch(cache_key, self.cache_ttls.get(endpoint), fetch))
+            self._inflight[flight_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        # Shielded so one caller giving up doesn't cancel the request for the rest
+        return await asyncio.shield(task)
+    
+    async def _load_or_fetch(self, cache_key: str, ttl: Optional[int], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        if ttl:
+            try:
+                cached = await redis_client.get(cache_key)
+                if cached is not None:
+                    return json.loads(cached)
+            except Exception as e:
+                logger.warning(f"SD response cache unavailable: {e}")
+        
+        result = await fetch()
+        
+        if ttl:
+            try:
+                await redis_client.set(cache_key, json.dumps(result), ex=ttl)
+            except Exception as e:
+                logger.warning(f"Failed to cache SD response: {e}")
+        return result
+    
     async def _request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Make HTTP request with retry logic"""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         
         for attempt in range(3):
             try:
+                await self._acquire()
                 response = await self.session.request(method, url, **kwargs)
                 
                 # Handle rate limiting
                 if response.status_code == 429:
-                    retry_after = int(response.headers.get("Retry-After", 60))
-                    logger.warning(f"Rate limited, waiting {retry_after}s")
-                    await asyncio.sleep(retry_after)
+                    await self._rate_limited(response)
                     continue
                 
                 # Handle server errors with exponential backoff
@@ -52,12 +240,8 @@ class SchedulesDirectClient:
                 
                 response.raise_for_status()
                 
-                # Handle gzipped responses
-                content = response.content
-                if response.headers.get("Content-Encoding") == "gzip":
-                    content = gzip.decompress(content)
-                
-                return json.loads(content.decode("utf-8"))
+                # httpx has already decoded any gzip Content-Encoding
+                return json.loads(response.content)
                 
             except httpx.TimeoutException:
                 if attempt == 2:  # Last attempt
@@ -77,11 +261,54 @@ class SchedulesDirectClient:
         
         raise Exception("Max retries exceeded")
     
+    async def _stream_request(self, method: str, endpoint: str, **kwargs) -> AsyncIterator[Any]:
+        """Make HTTP request and yield top-level JSON array items as they are parsed"""
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        
+        for attempt in range(3):
+            # Once items have been handed out a retry would duplicate them
+            yielded = False
+            try:
+                await self._acquire()
+                async with self.session.stream(method, url, **kwargs) as response:
+                    # Handle rate limiting
+                    if response.status_code == 429:
+                        await self._rate_limited(response)
+                        continue
+                    
+                    # Handle server errors with exponential backoff
+                    if response.status_code >= 500:
+                        wait_time = (2 ** attempt) * 1
+                        logger.warning(f"Server error {response.status_code}, retrying in {wait_time}s")
+                        await asyncio.sleep(wait_time)
+                        continue
+                    
+                    response.raise_for_status()
+                    
+                    parser = JSONArrayStreamParser()
+                    async for text in response.aiter_text():
+                        for item in parser.feed(text):
+                            yielded = True
+                            yield item
+                    for item in parser.close():
+                        yield item
+                    return
+            
+            except (httpx.TimeoutException, httpx.TransportError):
+                if yielded or attempt == 2:
+                    raise
+                wait_time = (2 ** attempt) * 1
+                logger.warning(f"Stream interrupted, retrying in {wait_time}s")
+                await asyncio.sleep(wait_time)
+        
+        raise Exception("Max retries exceeded")
+    
     async def authenticate(self, username: str, password: str) -> Dict[str, Any]:
         """Authenticate with Schedules Direct"""
-        # Hash password as required by SD API
-        password_hash = hashlib.sha1(password.encode()).hexdigest()
-        
+        return await self.authenticate_hashed(username, hash_sd_password(password))
+    
+    async def authenticate_hashed(self, username: str, password_hash: str) -> Dict[str, Any]:
+        """Authenticate with Schedules Direct using an already SHA1-hashed password"""
         data = {
             "username": username,
             "password": password_hash
@@ -96,8 +323,11 @@ class SchedulesDirectClient:
         if not token:
             raise Exception("No token received")
         
-        # Token typically expires in 24 hours
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=23)
+        # Token typically expires in 24 hours; prefer SD's own expiry when sent
+        if response.get("tokenExpires"):
+            expires_at = datetime.fromtimestamp(int(response["tokenExpires"]), timezone.utc)
+        else:
+            expires_at = datetime.now(timezone.utc) + timedelta(hours=23)
         
         return {
             "token": token,
@@ -107,50 +337,119 @@ class SchedulesDirectClient:
     async def get_lineups(self, token: str) -> List[Dict[str, Any]]:
         """Get available lineups for the authenticated user"""
         headers = {"token": token}
-        response = await self._request("GET", "/lineups", headers=headers)
+        response = await self._cached(
+            "lineups", _token_scope(token), lambda: self._request("GET", "/lineups", headers=headers)
+        )
         return response.get("lineups", [])
     
     async def get_lineup_details(self, token: str, lineup_id: str) -> Dict[str, Any]:
         """Get detailed information about a specific lineup"""
         headers = {"token": token}
-        response = await self._request("GET", f"/lineups/{lineup_id}", headers=headers)
-        return response
+        # Cached for every account, but only callers with the same token share a request,
+        # so one account's rejected token doesn't fail the others
+        return await self._cached(
+            "lineup_details", lineup_id, lambda: self._request("GET", f"/lineups/{lineup_id}", headers=headers),
+            flight_scope=_token_scope(token)
+        )
     
     async def get_stations_for_lineup(self, token: str, lineup_id: str) -> List[Dict[str, Any]]:
         """Get stations for a specific lineup"""
         lineup_details = await self.get_lineup_details(token, lineup_id)
         return lineup_details.get("stations", [])
     
+    async def _iter_chunked(self, method: str, endpoint: str, payloads: List[Any], **kwargs) -> AsyncIterator[Any]:
+        """Stream request chunks concurrently and yield response items as soon as they are parsed"""
+        # Bounded so a slow consumer applies backpressure instead of buffering whole responses
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        
+        async def send(payload: Any):
+            try:
+                async with self._semaphore:
+                    async for item in self._stream_request(method, endpoint, json=payload, **kwargs):
+                        await queue.put(item)
+                await queue.put(_CHUNK_DONE)
+            except Exception as e:
+                await queue.put(_ChunkFailed(e))
+        
+        tasks = [asyncio.ensure_future(send(payload)) for payload in payloads]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is _CHUNK_DONE:
+                    remaining -= 1
+                elif isinstance(item, _ChunkFailed):
+                    raise item.error
+                else:
+                    yield item
+        finally:
+            # Don't leave chunks running if the caller stops early or a chunk fails
+            for task in tasks:
+                task.cancel()
+    
+    async def iter_programs(self, token: str, program_ids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield program details one at a time, fetched in concurrent chunks of at most MAX_PROGRAMS_PER_REQUEST"""
+        headers = {"token": token}
+        payloads = list(_chunks(program_ids, MAX_PROGRAMS_PER_REQUEST))
+        
+        async for program in self._iter_chunked("POST", "/programs", payloads, headers=headers):
+            yield program
+    
     async def get_programs(self, token: str, program_ids: List[str]) -> List[Dict[str, Any]]:
         """Get program details for multiple program IDs"""
         if not program_ids:
             return []
         
+        return [program async for program in self.iter_programs(token, program_ids)]
+    
+    async def iter_schedules(self, token: str, station_dates: Dict[str, List[str]]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield station-day schedules one at a time, fetched in concurrent chunks of at most MAX_STATIONS_PER_REQUEST"""
         headers = {"token": token}
-        data = program_ids
+        data = [
+            {"stationID": station_id, "date": dates}
+            for station_id, dates in station_dates.items()
+            if dates
+        ]
+        payloads = list(_chunks(data, MAX_STATIONS_PER_REQUEST))
         
-        response = await self._request("POST", "/programs", headers=headers, json=data)
-        return response if isinstance(response, list) else []
+        async for schedule in self._iter_chunked("POST", "/schedules", payloads, headers=headers):
+            yield schedule
     
     async def get_schedules(self, token: str, station_ids: List[str], start_date: str, end_date: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get schedules for stations within a date range"""
         if not station_ids:
             return []
         
+        dates = [start_date, end_date] if end_date else [start_date]
+        station_dates = {station_id: dates for station_id in station_ids}
+        return [schedule async for schedule in self.iter_schedules(token, station_dates)]
+    
+    async def get_schedule_md5s(self, token: str, station_ids: List[str], dates: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Get schedule MD5s keyed by station ID and date"""
+        if not station_ids:
+            return {}
+        
         headers = {"token": token}
+        data = [{"stationID": station_id, "date": dates} for station_id in station_ids]
+        payloads = list(_chunks(data, MAX_STATIONS_PER_REQUEST))
+        
+        async def send(payload: List[Dict[str, Any]]) -> Any:
+            async with self._semaphore:
+                return await self._request("POST", "/schedules/md5", headers=headers, json=payload)
         
-        # Prepare request data
-        data = []
-        for station_id in station_ids:
-            entry = {"stationID": station_id}
-            if end_date:
-                entry["date"] = [start_date, end_date]
-            else:
-                entry["date"] = [start_date]
-            data.append(entry)
+        # MD5 responses are small, keyed objects so they are not streamed
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for response in await asyncio.gather(*(send(payload) for payload in payloads)):
+            if isinstance(response, dict):
+                result.update(response)
+        return result
+    
+    async def get_station_day_schedules(self, token: str, station_dates: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+        """Get schedules for an explicit set of dates per station"""
+        if not station_dates:
+            return []
         
-        response = await self._request("POST", "/schedules", headers=headers, json=data)
-        return response if isinstance(response, list) else []
+        return [schedule async for schedule in self.iter_schedules(token, station_dates)]
     
     async def get_program_images(self, token: str, program_id: str) -> List[Dict[str, Any]]:
         """Get images for a specific program"""
@@ -158,30 +457,79 @@ class SchedulesDirectClient:
         response = await self._request("GET", f"/metadata/programs/{program_id}", headers=headers)
         return response.get("data", {}).get("images", [])
     
+    async def iter_images(self, token: str, program_ids: List[str]) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Yield (program ID, images), fetched in concurrent chunks of at most MAX_IMAGES_PER_REQUEST"""
+        headers = {"token": token}
+        payloads = list(_chunks(program_ids, MAX_IMAGES_PER_REQUEST))
+        
+        async for item in self._iter_chunked("POST", "/metadata/programs", payloads, headers=headers):
+            program_id = item.get("programID")
+            if program_id:
+                yield program_id, item.get("data", {}).get("images", [])
+    
     async def batch_get_images(self, token: str, program_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
         """Get images for multiple programs"""
         if not program_ids:
             return {}
         
-        headers = {"token": token}
-        data = program_ids
-        
+        result = {}
         try:
-            response = await self._request("POST", "/metadata/programs", headers=headers, json=data)
-            
-            result = {}
-            for item in response:
-                program_id = item.get("programID")
-                if program_id:
-                    result[program_id] = item.get("data", {}).get("images", [])
-            
-            return result
+            async for program_id, images in self.iter_images(token, program_ids):
+                result[program_id] = images
         except Exception as e:
             logger.error(f"Failed to batch get images: {e}")
-            return {}
+        
+        return result
     
     async def get_status(self, token: str) -> Dict[str, Any]:
         """Get account status and quota information"""
         headers = {"token": token}
-        response = await self._request("GET", "/status", headers=headers)
-        return response
\ No newline at end of file
+        return await self._cached(
+            "status", _token_scope(token), lambda: self._request("GET", "/status", headers=headers)
+        )
+
+# Process-wide client shared by API handlers and worker jobs
+_shared_client: Optional[SchedulesDirectClient] = None
+
+def create_sd_client() -> SchedulesDirectClient:
+    """Create an SD client with pool settings from Settings"""
+    http2 = settings.SD_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("SD_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+    
+    return SchedulesDirectClient(
+        settings.SD_API_BASE,
+        settings.SD_APPID,
+        max_concurrency=settings.SD_MAX_CONCURRENCY,
+        limits=httpx.Limits(
+            max_connections=settings.SD_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SD_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SD_HTTP_KEEPALIVE_EXPIRY
+        ),
+        http2=http2,
+        timeout=settings.SD_HTTP_TIMEOUT,
+        governor=get_sd_governor(),
+        cache_ttls={
+            "lineups": settings.SD_CACHE_LINEUPS_TTL,
+            "lineup_details": settings.SD_CACHE_LINEUP_DETAILS_TTL,
+            "status": settings.SD_CACHE_STATUS_TTL,
+        }
+    )
+
+def get_sd_client() -> SchedulesDirectClient:
+    """Get the process-wide SD client, creating it on first use"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = create_sd_client()
+    return _shared_client
+
+async def close_sd_client():
+    """Close the process-wide SD client and its connection pool"""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import sd_governor_rate, sd_governor_tokens, sd_governor_pause, sd_governor_wait, sd_rate_limited
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Takes one token from the fleet-wide bucket.
+# KEYS: bucket hash, pause key. ARGV: max rate/s, min rate/s, burst, recovery ms.
+# Returns {ms to wait (0 = acquired), tokens * 1000, rate * 1000, pause ms left}.
+# The rate recovers linearly towards the maximum after being cut by a 429.
+_ACQUIRE_SCRIPT = """
+local max_rate = tonumber(ARGV[1])
+local min_rate = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local recovery = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+local rate = tonumber(state[3]) or max_rate
+local elapsed = math.max(0, now - ts)
+
+rate = math.max(min_rate, math.min(max_rate, rate + max_rate * elapsed / recovery))
+tokens = math.min(burst, tokens + elapsed * rate / 1000)
+
+local pause = redis.call('PTTL', KEYS[2])
+local wait = 0
+if pause > 0 then
+    wait = pause
+elseif tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now, 'rate', tostring(rate))
+redis.call('PEXPIRE', KEYS[1], recovery + math.ceil(burst * 1000 / min_rate))
+return {wait, math.floor(tokens * 1000), math.floor(rate * 1000), math.max(pause, 0)}
+"""
+
+# Pauses the fleet for at least ARGV[1] ms and cuts the rate by ARGV[2].
+# KEYS: bucket hash, pause key. Returns the new rate * 1000.
+_PAUSE_SCRIPT = """
+local pause_ms = tonumber(ARGV[1])
+if redis.call('PTTL', KEYS[2]) < pause_ms then
+    redis.call('SET', KEYS[2], 1, 'PX', pause_ms)
+end
+local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[3])
+rate = math.max(tonumber(ARGV[4]), rate * tonumber(ARGV[2]))
+redis.call('HSET', KEYS[1], 'rate', tostring(rate), 'tokens', '0')
+return math.floor(rate * 1000)
+"""
+
+class SDRateGovernor:
+    """Token bucket in Redis shared by every SD client in every API process and worker.
+
+    Each HTTP request to SD takes one token. A 429 anywhere pauses the whole
+    fleet for the announced Retry-After and halves the shared rate, which
+    then climbs back to the configured maximum over the recovery period, so
+    throughput settles just under SD's limit instead of repeatedly hitting it.
+    If Redis is unavailable the governor lets requests through.
+    """
+
+    BUCKET_KEY = "sd:governor:bucket"
+    PAUSE_KEY = "sd:governor:pause"
+
+    # Longest single sleep before re-checking the bucket
+    MAX_SLEEP_SECONDS = 5.0
+
+    def __init__(self, rate: float, min_rate: float, burst: int, recovery_seconds: int, backoff: float = 0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.recovery_ms = recovery_seconds * 1000
+        self.backoff = backoff
+
+    async def acquire(self):
+        """Wait until the fleet may send one more request to SD"""
+        started = time.monotonic()
+        while True:
+            try:
+                wait_ms, tokens, rate, pause_ms = await redis_client.eval(
+                    _ACQUIRE_SCRIPT, 2, self.BUCKET_KEY, self.PAUSE_KEY,
+                    self.rate, self.min_rate, self.burst, self.recovery_ms
+                )
+            except Exception as e:
+                logger.warning(f"SD rate governor unavailable, not throttling: {e}")
+                return
+
+            sd_governor_tokens.set(int(tokens) / 1000)
+            sd_governor_rate.set(int(rate) / 1000)
+            sd_governor_pause.set(int(pause_ms) / 1000)
+            if int(wait_ms) <= 0:
+                break
+            # Jittered so waiting clients don't all retry in the same instant
+            await asyncio.sleep(min(int(wait_ms) / 1000, self.MAX_SLEEP_SECONDS) * random.uniform(1.0, 1.1))
+
+        sd_governor_wait.observe(time.monotonic() - started)
+
+    async def pause(self, seconds: int):
+        """Stop every client for `seconds` after SD answered 429, and back off the shared rate"""
+        sd_rate_limited.inc()
+        try:
+            rate = await redis_client.eval(
+                _PAUSE_SCRIPT, 2, self.BUCKET_KEY, self.PAUSE_KEY,
+                seconds * 1000, self.backoff, self.rate, self.min_rate
+            )
+        except Exception as e:
+            logger.warning(f"SD rate governor unavailable, pausing this client only: {e}")
+            await asyncio.sleep(seconds)
+            return
+        sd_governor_rate.set(int(rate) / 1000)
+        sd_governor_pause.set(seconds)
+        logger.warning(f"SD rate limited; pausing all clients for {seconds}s at {int(rate) / 1000:.2f} req/s")
+
+_governor: Optional[SDRateGovernor] = None
+
+def get_sd_governor() -> SDRateGovernor:
+    """Get the process-wide governor configured from Settings"""
+    global _governor
+    if _governor is None:
+        _governor = SDRateGovernor(
+            settings.SD_RATE_PER_SECOND,
+            settings.SD_RATE_MIN_PER_SECOND,
+            settings.SD_RATE_BURST,
+            settings.SD_RATE_RECOVERY_SECONDS
+        )
+    return _governor
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import uuid
+import weakref
+from typing import Dict, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client
+from app.core.security import encrypt_data, decrypt_data
+from app.models.core import SchedulesDirectAccount
+from app.services.schedules_direct import get_sd_client
+
+logger = logging.getLogger(__name__)
+
+# Deletes the lock only if we still own it
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class SDTokenManager:
+    """Caches decrypted SD tokens and re-authenticates once per account across processes.
+
+    Tokens are kept decrypted in process memory and shared (still encrypted)
+    through Redis. When a token nears expiry one caller, chosen by a Redis
+    lock, calls SD's /token; everyone else keeps using the current token or,
+    if it has already expired, waits for the new one to be published.
+    """
+
+    def __init__(self, refresh_margin: timedelta, lock_timeout: int):
+        self.refresh_margin = refresh_margin
+        self.lock_timeout = lock_timeout
+        self._local: Dict[str, Tuple[str, datetime]] = {}
+        # Weak values, so a lock lives only while some coroutine holds or awaits it
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _cache_key(user_id: str) -> str:
+        return f"sd:token:{user_id}"
+
+    @staticmethod
+    def _lock_key(user_id: str) -> str:
+        return f"sd:token:lock:{user_id}"
+
+    def _is_fresh(self, expires_at: Optional[datetime]) -> bool:
+        return expires_at is not None and expires_at - self.refresh_margin > datetime.now(timezone.utc)
+
+    @staticmethod
+    def _is_valid(expires_at: Optional[datetime]) -> bool:
+        return expires_at is not None and expires_at > datetime.now(timezone.utc)
+
+    async def _load_shared(self, user_id: str) -> Optional[Tuple[str, datetime]]:
+        """Get the encrypted token and expiry published in Redis"""
+        raw = await redis_client.get(self._cache_key(user_id))
+        if not raw:
+            return None
+        data = json.loads(raw)
+        return data["token"], datetime.fromisoformat(data["expires_at"])
+
+    async def remember(self, user_id: str, encrypted_token: str, expires_at: datetime):
+        """Publish a token to this process and to every other process via Redis"""
+        ttl = int((expires_at - datetime.now(timezone.utc)).total_seconds())
+        if ttl <= 0:
+            return
+        await redis_client.set(
+            self._cache_key(user_id),
+            json.dumps({"token": encrypted_token, "expires_at": expires_at.isoformat()}),
+            ex=ttl
+        )
+        self._local[user_id] = (decrypt_data(encrypted_token), expires_at)
+
+    async def forget(self, user_id: str):
+        """Drop a cached token, e.g. after the account is reconnected"""
+        self._local.pop(user_id, None)
+        await redis_client.delete(self._cache_key(user_id))
+
+    async def get_token(self, db: Session, sd_account: SchedulesDirectAccount) -> str:
+        """Get a usable SD token for an account, refreshing it if it is close to expiry"""
+        user_id = str(sd_account.user_id)
+
+        cached = self._local.get(user_id)
+        if cached and self._is_fresh(cached[1]):
+            return cached[0]
+
+        # One coroutine per process goes on to Redis/SD for a given account
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            cached = self._local.get(user_id)
+            if cached and self._is_fresh(cached[1]):
+                return cached[0]
+
+            shared = await self._load_shared(user_id)
+            if shared and self._is_fresh(shared[1]):
+                self._local[user_id] = (decrypt_data(shared[0]), shared[1])
+                return self._local[user_id][0]
+
+            if self._is_fresh(sd_account.token_expires_at):
+                await self.remember(user_id, sd_account.sd_token, sd_account.token_expires_at)
+                return self._local[user_id][0]
+
+            return await self._refresh(db, sd_account)
+
+    async def _refresh(self, db: Session, sd_account: SchedulesDirectAccount) -> str:
+        """Re-authenticate with SD, letting only one process across the fleet do it"""
+        user_id = str(sd_account.user_id)
+        current = self._local.get(user_id)
+        if current is None and self._is_valid(sd_account.token_expires_at):
+            current = (decrypt_data(sd_account.sd_token), sd_account.token_expires_at)
+
+        lock_value = uuid.uuid4().hex
+        acquired = await redis_client.set(self._lock_key(user_id), lock_value, nx=True, ex=self.lock_timeout)
+
+        if not acquired:
+            # Another process is refreshing; a still-valid token is good enough meanwhile
+            if current and self._is_valid(current[1]):
+                return current[0]
+            return await self._wait_for_refresh(user_id)
+
+        try:
+            # Another process may have finished a refresh just before we took the lock
+            shared = await self._load_shared(user_id)
+            if shared and self._is_fresh(shared[1]):
+                self._local[user_id] = (decrypt_data(shared[0]), shared[1])
+                return self._local[user_id][0]
+
+            if not sd_account.sd_password_hash or not settings.SD_STORE_PASSWORD_HASH:
+                if current and self._is_valid(current[1]):
+                    return current[0]
+                raise ValueError("Schedules Direct token expired; reconnect the account")
+
+            logger.info(f"Refreshing SD token for user {user_id}")
+            token_data = await get_sd_client().authenticate_hashed(
+                sd_account.sd_username, decrypt_data(sd_account.sd_password_hash)
+            )
+
+            encrypted_token = encrypt_data(token_data["token"])
+            sd_account.sd_token = encrypted_token
+            sd_account.token_expires_at = token_data["expires_at"]
+            db.commit()
+
+            await self.remember(user_id, encrypted_token, token_data["expires_at"])
+            return token_data["token"]
+        finally:
+            await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, self._lock_key(user_id), lock_value)
+
+    async def _wait_for_refresh(self, user_id: str) -> str:
+        """Wait for the process holding the refresh lock to publish a new token"""
+        deadline = datetime.now(timezone.utc) + timedelta(seconds=self.lock_timeout)
+        while datetime.now(timezone.utc) < deadline:
+            await asyncio.sleep(0.25)
+            shared = await self._load_shared(user_id)
+            if shared and self._is_valid(shared[1]):
+                self._local[user_id] = (decrypt_data(shared[0]), shared[1])
+                return self._local[user_id][0]
+            if not await redis_client.exists(self._lock_key(user_id)):
+                break
+
+        raise ValueError("Timed out waiting for Schedules Direct token refresh")
+
+# Global token manager instance
+token_manager = SDTokenManager(
+    refresh_margin=timedelta(seconds=settings.SD_TOKEN_REFRESH_MARGIN_SECONDS),
+    lock_timeout=settings.SD_TOKEN_LOCK_SECONDS
+)
@@ -0,0 +1,146 @@
+import base64
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func, and_, or_, true, cast, literal_column, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.core import Program, Schedule, LineupStation, UserLineup
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(score: float, program_id: str) -> str:
+    """Encode the last result of a page as an opaque keyset cursor"""
+    return base64.urlsafe_b64encode(json.dumps([score, program_id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Decode a keyset cursor; raises ValueError if it is malformed"""
+    try:
+        score, program_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), str(program_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _search_query(q: str):
+    # Stemmed words match titles and descriptions; unstemmed ones match names
+    english = func.websearch_to_tsquery(literal_column("'english'::regconfig"), q)
+    simple = func.websearch_to_tsquery(literal_column("'simple'::regconfig"), q)
+    return english.op("||")(simple)
+
+def _user_station_ids(user_id: str):
+    return (
+        select(LineupStation.station_id)
+        .join(UserLineup, UserLineup.lineup_id == LineupStation.lineup_id)
+        .where(UserLineup.user_id == uuid.UUID(user_id))
+    )
+
+def _upcoming_airings(user_id: str, now: datetime, new_only: bool):
+    """Airings of the outer Program on the user's stations that haven't started yet"""
+    stmt = select(Schedule.station_id, Schedule.start_utc, Schedule.is_new).where(
+        Schedule.program_id == Program.program_id,
+        Schedule.start_utc >= now,
+        Schedule.station_id.in_(_user_station_ids(user_id))
+    )
+    if new_only:
+        stmt = stmt.where(Schedule.is_new.is_(True))
+    return stmt
+
+async def search_programs(
+    db: AsyncSession,
+    user_id: str,
+    q: str,
+    genre: Optional[str] = None,
+    new_only: bool = False,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """Get a page of programs matching a query, best matches first.
+
+    Candidates come from the full-text index (title, episode title, people,
+    description) or the trigram index on title, so misspelled titles still
+    match. Filters are applied in the same query, and pages are keyed on
+    (score, program_id) rather than offsets.
+    """
+    now = datetime.now(timezone.utc)
+    query = _search_query(q)
+    score = (
+        cast(func.ts_rank_cd(Program.search_vector, query), Float)
+        + cast(func.similarity(Program.title, q), Float)
+    ).label("score")
+
+    candidates = select(Program.program_id, score).where(
+        or_(Program.search_vector.op("@@")(query), Program.title.op("%")(q))
+    )
+    if genre:
+        candidates = candidates.where(Program.genres.contains([genre]))
+    if new_only:
+        candidates = candidates.where(_upcoming_airings(user_id, now, new_only=True).exists())
+    ranked = candidates.subquery()
+
+    page = select(ranked.c.program_id, ranked.c.score)
+    if cursor:
+        last_score, last_program_id = decode_cursor(cursor)
+        page = page.where(or_(
+            ranked.c.score < last_score,
+            and_(ranked.c.score == last_score, ranked.c.program_id > last_program_id)
+        ))
+    page = page.order_by(ranked.c.score.desc(), ranked.c.program_id).limit(limit + 1)
+
+    hits = (await db.execute(page)).all()
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    if not hits:
+        return {"results": [], "next_cursor": None}
+
+    # Details and next airing only for the page, not for every candidate
+    next_airing = (
+        _upcoming_airings(user_id, now, new_only)
+        .order_by(Schedule.start_utc)
+        .limit(1)
+        .lateral()
+    )
+    details = (
+        select(
+            Program.program_id,
+            Program.title,
+            Program.episode_title,
+            Program.season,
+            Program.episode,
+            Program.genres,
+            next_airing.c.station_id,
+            next_airing.c.start_utc,
+            next_airing.c.is_new,
+        )
+        .outerjoin(next_airing, true())
+        .where(Program.program_id.in_([program_id for program_id, _ in hits]))
+    )
+    rows = {row.program_id: row for row in (await db.execute(details)).all()}
+
+    results: List[Dict[str, Any]] = []
+    for program_id, program_score in hits:
+        row = rows.get(program_id)
+        if row is None:
+            continue
+        results.append({
+            "program_id": program_id,
+            "title": row.title,
+            "episode_title": row.episode_title,
+            "season": row.season,
+            "episode": row.episode,
+            "genres": row.genres,
+            "score": program_score,
+            "next_airing": {
+                "station_id": row.station_id,
+                "start": int(row.start_utc.timestamp()),
+                "is_new": row.is_new,
+            } if row.start_utc is not None else None,
+        })
+
+    last_program_id, last_score = hits[-1]
+    return {
+        "results": results,
+        "next_cursor": encode_cursor(last_score, last_program_id) if has_more else None,
+    }
@@ -0,0 +1,341 @@
+import heapq
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, or_, text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client, redis_binary_client, sync_redis_client, sync_redis_binary_client
+from app.models.core import Program
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "suggest:snapshot"
+VERSION_KEY = "suggest:version"
+FULL_BUILD_KEY = "suggest:full_built_at"
+
+KIND_TITLE = 0  # Movies, specials and other one-off programs
+KIND_SERIES = 1
+KIND_PERSON = 2
+KIND_NAMES = ("title", "series", "person")
+
+# Prefixes up to this length have their top entries precomputed; longer ones scan a short range
+HEAD_PREFIX_LEN = 3
+MAX_SUGGESTIONS = 20
+MAX_SCAN = 5000
+
+MAGIC = b"SDSUGG01"
+HEADER = struct.Struct("<8sII")  # magic, record count, head count
+OFFSET = struct.Struct("<I")
+RECORD = struct.Struct("<IBHH")  # weight, kind, key length, display length
+HEAD = struct.Struct("<HB")  # prefix length, entry count
+
+LEADING_ARTICLE = re.compile(r"^(the|a|an) ")
+# Letters and digits in any script are kept; everything else separates words
+NON_WORD = re.compile(r"[\W_]+")
+
+# (display text, kind) -> weight
+Entries = Dict[Tuple[str, int], int]
+
+def normalize(value: str) -> str:
+    """Fold case, accents and punctuation so "Amélie!" and "amelie" share a key"""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return NON_WORD.sub(" ", stripped.lower()).strip()
+
+def _keys_for(display: str) -> List[str]:
+    key = normalize(display)
+    if not key:
+        return []
+    # "The Office" is also found by typing "off..."
+    without_article = LEADING_ARTICLE.sub("", key)
+    return [key] if without_article == key or not without_article else [key, without_article]
+
+def encode_snapshot(entries: Entries) -> bytes:
+    """Serialize entries into a sorted, mmap-friendly prefix index"""
+    records = []
+    for (display, kind), weight in entries.items():
+        display_bytes = display.encode()[:0xFFFF]
+        for key in _keys_for(display):
+            records.append((key.encode()[:0xFFFF], display_bytes, kind, min(weight, 0xFFFFFFFF)))
+    records.sort(key=lambda record: (record[0], -record[3]))
+
+    # Top entries for every short prefix, so one- to three-letter lookups never scan
+    heads: Dict[bytes, List[Tuple[int, int]]] = {}
+    for index, (key, _, _, weight) in enumerate(records):
+        for length in range(1, min(len(key), HEAD_PREFIX_LEN) + 1):
+            top = heads.setdefault(key[:length], [])
+            if len(top) < MAX_SUGGESTIONS:
+                heapq.heappush(top, (weight, -index))
+            elif weight > top[0][0]:
+                heapq.heapreplace(top, (weight, -index))
+
+    head_prefixes = sorted(heads)
+    header_size = HEADER.size + OFFSET.size * (len(records) + len(head_prefixes))
+
+    body = bytearray()
+    record_offsets = []
+    for key, display_bytes, kind, weight in records:
+        record_offsets.append(header_size + len(body))
+        body += RECORD.pack(weight, kind, len(key), len(display_bytes)) + key + display_bytes
+
+    head_offsets = []
+    for prefix in head_prefixes:
+        head_offsets.append(header_size + len(body))
+        ranked = [-neg_index for _, neg_index in sorted(heads[prefix], reverse=True)]
+        body += HEAD.pack(len(prefix), len(ranked)) + prefix
+        body += b"".join(OFFSET.pack(index) for index in ranked)
+
+    out = bytearray(HEADER.pack(MAGIC, len(records), len(head_prefixes)))
+    out += b"".join(OFFSET.pack(offset) for offset in record_offsets + head_offsets)
+    out += body
+    return bytes(out)
+
+class SuggestIndex:
+    """Read-only prefix index over a snapshot buffer (usually an mmap)"""
+
+    def __init__(self, buffer):
+        magic, self.record_count, self.head_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a suggestion index snapshot")
+        self.buffer = buffer
+
+    def _offset(self, slot: int) -> int:
+        return OFFSET.unpack_from(self.buffer, HEADER.size + OFFSET.size * slot)[0]
+
+    def _key(self, index: int) -> bytes:
+        offset = self._offset(index)
+        _, _, key_length, _ = RECORD.unpack_from(self.buffer, offset)
+        start = offset + RECORD.size
+        return bytes(self.buffer[start:start + key_length])
+
+    def record(self, index: int) -> Tuple[str, int, int]:
+        """Get (display, kind, weight) for a record"""
+        offset = self._offset(index)
+        weight, kind, key_length, display_length = RECORD.unpack_from(self.buffer, offset)
+        start = offset + RECORD.size + key_length
+        return bytes(self.buffer[start:start + display_length]).decode(), kind, weight
+
+    def _head(self, prefix: bytes) -> Optional[List[int]]:
+        lo, hi = 0, self.head_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self._offset(self.record_count + mid)
+            length, count = HEAD.unpack_from(self.buffer, offset)
+            start = offset + HEAD.size
+            candidate = bytes(self.buffer[start:start + length])
+            if candidate == prefix:
+                indices = start + length
+                return [OFFSET.unpack_from(self.buffer, indices + OFFSET.size * i)[0] for i in range(count)]
+            if candidate < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _range(self, prefix: bytes) -> Tuple[int, int]:
+        """Get the [lo, hi) record range whose keys start with prefix"""
+        lo, hi = 0, self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        start, hi = lo, self.record_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid)[:len(prefix)] <= prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        return start, lo
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get the heaviest titles, series and people whose key starts with the query"""
+        prefix = normalize(query).encode()
+        if not prefix:
+            return []
+
+        if len(prefix) <= HEAD_PREFIX_LEN:
+            indices = self._head(prefix) or []
+        else:
+            lo, hi = self._range(prefix)
+            candidates = ((self.record(index)[2], index) for index in range(lo, min(hi, lo + MAX_SCAN)))
+            indices = [index for _, index in heapq.nlargest(MAX_SUGGESTIONS, candidates)]
+
+        suggestions = []
+        seen = set()
+        for index in indices:
+            display, kind, _ = self.record(index)
+            # A title indexed with and without its article appears once
+            if (display, kind) in seen:
+                continue
+            seen.add((display, kind))
+            suggestions.append({"text": display, "kind": KIND_NAMES[kind]})
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+    def entries(self) -> Entries:
+        """Get every entry, for incremental rebuilds"""
+        entries: Entries = {}
+        for index in range(self.record_count):
+            display, kind, weight = self.record(index)
+            entries[(display, kind)] = weight
+        return entries
+
+# Building (worker)
+
+def _is_series():
+    return func.bool_or(or_(Program.program_id.like("EP%"), Program.program_id.like("SH%")))
+
+def _add_titles(entries: Entries, rows: Iterable[Tuple[str, int, bool]]):
+    for title, count, is_series in rows:
+        if not title:
+            continue
+        kind, other = (KIND_SERIES, KIND_TITLE) if is_series else (KIND_TITLE, KIND_SERIES)
+        entries.pop((title, other), None)
+        entries[(title, kind)] = count
+
+PEOPLE_SQL = """
+SELECT name, count(DISTINCT program_id) FROM (
+    SELECT program_id, p->>'name' AS name FROM programs, json_array_elements(COALESCE("cast", '[]'::json)) p {where}
+    UNION ALL
+    SELECT program_id, p->>'name' AS name FROM programs, json_array_elements(COALESCE(crew, '[]'::json)) p {where}
+) names WHERE name IS NOT NULL AND name <> '' GROUP BY name
+"""
+
+def build_entries(db: Session) -> Entries:
+    """Build every entry from the programs table"""
+    entries: Entries = {}
+    _add_titles(entries, db.execute(select(Program.title, func.count(), _is_series()).group_by(Program.title)))
+    for name, count in db.execute(text(PEOPLE_SQL.format(where=""))):
+        entries[(name, KIND_PERSON)] = count
+    return entries
+
+def update_entries(db: Session, entries: Entries, program_ids: List[str]) -> Entries:
+    """Fold changed programs into existing entries.
+
+    Title weights are recounted exactly. Counting a person's programs would
+    scan every program's cast, so people only gain weight here; the periodic
+    full rebuild corrects them.
+    """
+    for start in range(0, len(program_ids), 5000):
+        chunk = program_ids[start:start + 5000]
+        titles = select(Program.title).where(Program.program_id.in_(chunk)).distinct()
+        _add_titles(entries, db.execute(
+            select(Program.title, func.count(), _is_series()).where(Program.title.in_(titles)).group_by(Program.title)
+        ))
+        rows = db.execute(
+            text(PEOPLE_SQL.format(where="WHERE program_id = ANY(:program_ids)")), {"program_ids": chunk}
+        )
+        for name, count in rows:
+            entries[(name, KIND_PERSON)] = max(entries.get((name, KIND_PERSON), 0), count)
+    return entries
+
+def load_published_entries() -> Optional[Entries]:
+    """Get the entries of the current snapshot, if there is one"""
+    data = sync_redis_binary_client.get(SNAPSHOT_KEY)
+    return SuggestIndex(data).entries() if data else None
+
+def publish_snapshot(entries: Entries, full: bool) -> str:
+    """Store a new snapshot in Redis for API processes to pick up"""
+    data = encode_snapshot(entries)
+    version = f"{int(time.time() * 1000)}"
+    pipe = sync_redis_binary_client.pipeline(transaction=True)
+    pipe.set(SNAPSHOT_KEY, data)
+    pipe.set(VERSION_KEY, version)
+    if full:
+        pipe.set(FULL_BUILD_KEY, datetime.now(timezone.utc).isoformat())
+    pipe.execute()
+    logger.info(f"Published suggestion index {version}: {len(entries)} entries, {len(data)} bytes")
+    return version
+
+def needs_full_rebuild() -> bool:
+    built_at = sync_redis_client.get(FULL_BUILD_KEY)
+    if not built_at:
+        return True
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(built_at)
+    return age > timedelta(hours=settings.SUGGEST_FULL_REBUILD_HOURS)
+
+def refresh_suggest_index(db: Session, program_ids: Optional[List[str]] = None) -> str:
+    """Rebuild the snapshot, incrementally from changed programs when possible"""
+    entries = None
+    if program_ids is not None and not needs_full_rebuild():
+        entries = load_published_entries()
+
+    if entries is None:
+        return publish_snapshot(build_entries(db), full=True)
+    return publish_snapshot(update_entries(db, entries, program_ids), full=False)
+
+# Serving (API processes)
+
+_index: Optional[SuggestIndex] = None
+_index_file = None
+_version: Optional[str] = None
+_checked_at = 0.0
+
+def _snapshot_path(version: str) -> str:
+    return os.path.join(settings.SUGGEST_INDEX_DIR, f"suggest-{version}.idx")
+
+def _write_snapshot(version: str, data: bytes):
+    """Write a snapshot file atomically and remove older ones"""
+    os.makedirs(settings.SUGGEST_INDEX_DIR, exist_ok=True)
+    path = _snapshot_path(version)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    # Processes still mapping an old file keep reading it after the unlink
+    for name in os.listdir(settings.SUGGEST_INDEX_DIR):
+        if name.startswith("suggest-") and name.endswith(".idx") and name != os.path.basename(path):
+            try:
+                os.unlink(os.path.join(settings.SUGGEST_INDEX_DIR, name))
+            except OSError:
+                pass
+
+async def get_suggest_index() -> Optional[SuggestIndex]:
+    """Get the current index, mapping a newer snapshot when one has been published.
+
+    Each host keeps one file per snapshot version, so every worker process
+    on it maps the same pages.
+    """
+    global _index, _index_file, _version, _checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _checked_at < settings.SUGGEST_REFRESH_SECONDS:
+        return _index
+    _checked_at = now
+
+    try:
+        version = await redis_client.get(VERSION_KEY)
+        if not version or version == _version:
+            return _index
+
+        path = _snapshot_path(version)
+        if not os.path.exists(path):
+            data = await redis_binary_client.get(SNAPSHOT_KEY)
+            if not data:
+                return _index
+            _write_snapshot(version, data)
+
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception as e:
+        logger.warning(f"Suggestion index unavailable: {e}")
+        return _index
+
+    if _index_file is not None:
+        _index_file.close()
+    _index, _index_file, _version = SuggestIndex(mapped), mapped, version
+    return _index
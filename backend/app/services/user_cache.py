@@ -0,0 +1,98 @@
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, Optional, Set, Tuple
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import redis_client, sync_redis_client
+from app.models.core import User
+
+logger = logging.getLogger(__name__)
+
+# Columns needed to authorize a request; secrets are never cached
+CACHED_FIELDS = ("email", "timezone", "is_active", "is_admin", "created_at", "updated_at")
+
+# user_id -> (monotonic expiry, cached fields)
+_local_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+def _cache_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+def _serialize(user: User) -> Dict[str, Any]:
+    data = {field: getattr(user, field) for field in CACHED_FIELDS}
+    for field in ("created_at", "updated_at"):
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+def _to_user(user_id: str, data: Dict[str, Any]) -> User:
+    """Build a detached, read-only User from cached fields"""
+    values = dict(data)
+    for field in ("created_at", "updated_at"):
+        if values.get(field):
+            values[field] = datetime.fromisoformat(values[field])
+    return User(id=uuid.UUID(user_id), **values)
+
+async def get_user(db: AsyncSession, user_id: str) -> Optional[User]:
+    """Get a user by ID from the in-process cache, then Redis, then the database"""
+    now = time.monotonic()
+    cached = _local_cache.get(user_id)
+    if cached and cached[0] > now:
+        return _to_user(user_id, cached[1])
+
+    try:
+        raw = await redis_client.get(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"User cache unavailable: {e}")
+        raw = None
+
+    if raw:
+        data = json.loads(raw)
+    else:
+        user = await db.get(User, uuid.UUID(user_id))
+        if not user:
+            return None
+        data = _serialize(user)
+        try:
+            await redis_client.set(_cache_key(user_id), json.dumps(data), ex=settings.USER_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"User cache unavailable: {e}")
+
+    _local_cache[user_id] = (now + settings.USER_CACHE_LOCAL_TTL_SECONDS, data)
+    return _to_user(user_id, data)
+
+async def invalidate_user(user_id: str):
+    """Drop a user from the caches after it changes"""
+    _local_cache.pop(user_id, None)
+    await redis_client.delete(_cache_key(user_id))
+
+def invalidate_user_sync(user_id: str):
+    """Drop a user from the caches from synchronous code"""
+    _local_cache.pop(user_id, None)
+    try:
+        sync_redis_client.delete(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"Failed to invalidate cached user {user_id}: {e}")
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context):
+    changed: Set[str] = session.info.setdefault("changed_user_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(str(obj.id))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session):
+    # Only after commit, so a concurrent request can't re-cache the old row
+    for user_id in session.info.pop("changed_user_ids", set()):
+        invalidate_user_sync(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session):
+    session.info.pop("changed_user_ids", None)
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+
+from app.core.redis import redis_client, sync_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever any guide data changes, for views not scoped to a lineup or station
+CATALOG_VERSION_KEY = "version:catalog"
+
+def lineup_version_key(lineup_id: str) -> str:
+    return f"version:lineup:{lineup_id}"
+
+def station_version_key(station_id: str) -> str:
+    return f"version:station:{station_id}"
+
+def user_version_key(user_id: str) -> str:
+    return f"version:user:{user_id}"
+
+def user_lineups_key(user_id: str) -> str:
+    return f"version:user:{user_id}:lineups"
+
+# Backstop for a lineup list cached just as the user changed their lineups
+USER_LINEUPS_TTL_SECONDS = 24 * 3600
+
+def _bump(keys: List[str]):
+    now = int(time.time())
+    pipe = sync_redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hincrby(key, "v", 1)
+        pipe.hset(key, "modified", now)
+    pipe.execute()
+    logger.debug(f"Bumped {len(keys)} content versions")
+
+def bump_versions(lineup_ids: Iterable[str] = (), station_ids: Iterable[str] = ()):
+    """Record that data for these lineups and stations (and so the catalog) changed"""
+    keys = [lineup_version_key(lineup_id) for lineup_id in set(lineup_ids)]
+    keys += [station_version_key(station_id) for station_id in set(station_ids)]
+    if keys:
+        _bump(keys + [CATALOG_VERSION_KEY])
+
+def bump_user_versions(user_ids: Iterable[str]):
+    """Record that per-user data (favourites, rule matches) changed; guide versions are untouched"""
+    keys = [user_version_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        _bump(keys)
+
+def user_lineups_changed(user_id: str):
+    """Record that a user added or removed a lineup, dropping their cached lineup list"""
+    try:
+        sync_redis_client.delete(user_lineups_key(user_id))
+        bump_user_versions([user_id])
+    except Exception as e:
+        # The cached list still expires, so views catch up within USER_LINEUPS_TTL_SECONDS
+        logger.warning(f"Failed to record lineup change for user {user_id}: {e}")
+
+async def get_user_version_keys(user_id: str, load_lineup_ids: Callable[[], Awaitable[List[str]]]) -> List[str]:
+    """Get the version keys of a user's views: their own, and those of the lineups they have added.
+
+    The lineup list is kept in Redis until the user changes it, so
+    revalidating a view reads no rows; `load_lineup_ids` only runs on a miss.
+    """
+    key = user_lineups_key(user_id)
+    cached = await redis_client.get(key)
+    if cached is None:
+        lineup_ids = sorted(await load_lineup_ids())
+        await redis_client.set(key, json.dumps(lineup_ids), ex=USER_LINEUPS_TTL_SECONDS)
+    else:
+        lineup_ids = json.loads(cached)
+    return [user_version_key(user_id)] + [lineup_version_key(lineup_id) for lineup_id in lineup_ids]
+
+async def get_versions(keys: List[str]) -> Tuple[str, Optional[datetime]]:
+    """Get a combined version tag and last-modified time for a set of version keys.
+
+    A key that has never been bumped reads as version 0 with no modification
+    time, so the tag still changes if Redis loses the counters.
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hmget(key, "v", "modified")
+        results = await pipe.execute()
+
+    parts = []
+    modified = None
+    for key, (version, timestamp) in zip(keys, results):
+        parts.append(f"{key}={version or 0}@{timestamp or '-'}")
+        if timestamp is not None:
+            modified = max(modified or 0, int(timestamp))
+
+    tag = hashlib.sha1("|".join(parts).encode()).hexdigest()
+    return tag, (datetime.fromtimestamp(modified, timezone.utc) if modified is not None else None)
@@ -0,0 +1,215 @@
+import gzip
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import date, datetime, time, timedelta, timezone
+
+from lxml import etree
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.database import AsyncSessionLocal
+from app.models.core import Schedule, Program, Station, LineupStation, UserLineup
+from app.services.object_storage import get_object_store
+
+logger = logging.getLogger(__name__)
+
+GENERATOR_NAME = "SD Browser"
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='utf-8'?>\n"
+
+# Precomputed <programme> elements, one gzip member per station per UTC day
+FRAGMENT_PREFIX = "xmltv/fragments"
+
+def xmltv_channel_id(station_id: str) -> str:
+    return f"I{station_id}.json.schedulesdirect.org"
+
+def xmltv_time(value: datetime) -> str:
+    return value.strftime("%Y%m%d%H%M%S +0000")
+
+def fragment_key(station_id: str, day: date) -> str:
+    return f"{FRAGMENT_PREFIX}/{day.isoformat()}/{station_id}.xml.gz"
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+def channel_element(station_id: str, callsign: Optional[str], name: Optional[str], channel: Optional[str], logo: Optional[str]) -> etree._Element:
+    """Build one <channel> element"""
+    element = etree.Element("channel", id=xmltv_channel_id(station_id))
+    for display_name in (f"{channel} {callsign}" if channel and callsign else None, callsign, channel, name):
+        if display_name:
+            etree.SubElement(element, "display-name").text = display_name
+    if logo:
+        etree.SubElement(element, "icon", src=logo)
+    return element
+
+def programme_element(row: Any) -> etree._Element:
+    """Build one <programme> element from a joined schedule/program row"""
+    element = etree.Element(
+        "programme",
+        start=xmltv_time(row.start_utc),
+        stop=xmltv_time(row.end_utc),
+        channel=xmltv_channel_id(row.station_id)
+    )
+    etree.SubElement(element, "title", lang="en").text = row.title or row.program_id
+    if row.episode_title:
+        etree.SubElement(element, "sub-title", lang="en").text = row.episode_title
+    if row.description:
+        etree.SubElement(element, "desc", lang="en").text = row.description
+    for genre in row.genres or []:
+        etree.SubElement(element, "category", lang="en").text = genre
+    if row.season or row.episode:
+        # xmltv_ns numbers are zero-based
+        season = str(row.season - 1) if row.season else ""
+        episode = str(row.episode - 1) if row.episode else ""
+        etree.SubElement(element, "episode-num", system="xmltv_ns").text = f"{season}.{episode}."
+    etree.SubElement(element, "episode-num", system="dd_progid").text = f"{row.program_id[:10]}.{row.program_id[10:]}"
+    if row.is_new:
+        etree.SubElement(element, "new")
+    elif row.original_air_date:
+        etree.SubElement(element, "previously-shown", start=row.original_air_date.strftime("%Y%m%d"))
+    if row.live:
+        etree.SubElement(element, "live")
+    if row.premiere:
+        etree.SubElement(element, "premiere")
+    if row.finale:
+        etree.SubElement(element, "last-chance")
+    if row.subtitles:
+        etree.SubElement(element, "subtitles", type="teletext")
+    return element
+
+def programme_query(station_ids: List[str], start: datetime, end: datetime):
+    """Airings with their program details, in channel then time order"""
+    return (
+        select(
+            Schedule.station_id,
+            Schedule.program_id,
+            Schedule.start_utc,
+            Schedule.end_utc,
+            Schedule.is_new,
+            Schedule.live,
+            Schedule.premiere,
+            Schedule.finale,
+            Schedule.subtitles,
+            Program.title,
+            Program.episode_title,
+            Program.description,
+            Program.genres,
+            Program.season,
+            Program.episode,
+            Program.original_air_date,
+        )
+        .join(Program, Program.program_id == Schedule.program_id)
+        .where(
+            Schedule.station_id.in_(station_ids),
+            Schedule.start_utc >= start,
+            Schedule.start_utc < end
+        )
+        .order_by(Schedule.station_id, Schedule.start_utc)
+    )
+
+async def get_export_channels(db: AsyncSession, user_id: str, station_ids: Optional[List[str]] = None) -> List[Any]:
+    """Get the user's stations (optionally a subset) with their channel numbers"""
+    stmt = (
+        select(Station.id, Station.callsign, Station.name, Station.logo_uri, LineupStation.channel)
+        .join(LineupStation, LineupStation.station_id == Station.id)
+        .join(UserLineup, UserLineup.lineup_id == LineupStation.lineup_id)
+        .where(UserLineup.user_id == uuid.UUID(user_id))
+        .distinct(Station.id)
+        .order_by(Station.id)
+    )
+    if station_ids:
+        stmt = stmt.where(Station.id.in_(station_ids))
+    return (await db.execute(stmt)).all()
+
+def render_fragments(station_ids: List[str], rows: List[Any]) -> Dict[str, bytes]:
+    """Render one gzipped fragment of <programme> elements per station.
+
+    Stations without airings get an empty fragment, so they are not
+    regenerated on every export.
+    """
+    chunks: Dict[str, List[bytes]] = {station_id: [] for station_id in station_ids}
+    for row in rows:
+        chunks[row.station_id].append(etree.tostring(programme_element(row), encoding="utf-8"))
+    return {station_id: gzip.compress(b"".join(parts)) for station_id, parts in chunks.items()}
+
+def rebuild_fragments(db: Session, station_days: List[Tuple[str, str]]) -> int:
+    """Regenerate the stored fragments for changed station-days"""
+    by_day: Dict[date, List[str]] = {}
+    for station_id, day in station_days:
+        by_day.setdefault(date.fromisoformat(day), []).append(station_id)
+
+    store = get_object_store()
+    written = 0
+    for day, station_ids in by_day.items():
+        start, end = day_bounds(day)
+        rows = db.execute(programme_query(station_ids, start, end)).all()
+        for station_id, data in render_fragments(station_ids, rows).items():
+            store.put(fragment_key(station_id, day), data)
+            written += 1
+
+    logger.info(f"Rebuilt {written} XMLTV fragments across {len(by_day)} days")
+    return written
+
+def prune_fragments(retention_days: int) -> int:
+    """Delete fragments for days older than the retention window"""
+    cutoff = datetime.now(timezone.utc).date() - timedelta(days=retention_days)
+    store = get_object_store()
+    pruned = 0
+    for key in list(store.list(FRAGMENT_PREFIX)):
+        day = date.fromisoformat(key.split("/")[-2])
+        if day < cutoff:
+            store.delete(key)
+            pruned += 1
+    if pruned:
+        logger.info(f"Pruned {pruned} XMLTV fragments before {cutoff}")
+    return pruned
+
+async def load_fragments(station_ids: List[str], day: date) -> Dict[str, bytes]:
+    """Get the stored fragments for one day, generating any that are missing"""
+    store = get_object_store()
+    fragments: Dict[str, bytes] = {}
+    missing: List[str] = []
+    for station_id in station_ids:
+        data = await store.aget(fragment_key(station_id, day))
+        if data is None:
+            missing.append(station_id)
+        else:
+            fragments[station_id] = data
+
+    if missing:
+        start, end = day_bounds(day)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(programme_query(missing, start, end))).all()
+        for station_id, data in render_fragments(missing, rows).items():
+            await store.aput(fragment_key(station_id, day), data)
+            fragments[station_id] = data
+    return fragments
+
+async def stream_xmltv(channels: List[Any], days: List[date], compress: bool = False) -> AsyncIterator[bytes]:
+    """Yield an XMLTV document for the channels and days from stored fragments.
+
+    Each fragment is a complete gzip member, and concatenated members are a
+    valid gzip stream, so a compressed export passes fragments through
+    untouched; only the header and footer are compressed here.
+    """
+    header = b"".join(
+        [XML_DECLARATION, f'<tv generator-info-name="{GENERATOR_NAME}">'.encode()]
+        + [
+            etree.tostring(channel_element(c.id, c.callsign, c.name, c.channel, c.logo_uri), encoding="utf-8")
+            for c in channels
+        ]
+    )
+    yield gzip.compress(header) if compress else header
+
+    station_ids = [channel.id for channel in channels]
+    for day in days:
+        fragments = await load_fragments(station_ids, day)
+        for station_id in station_ids:
+            data = fragments[station_id]
+            yield data if compress else gzip.decompress(data)
+
+    yield gzip.compress(b"</tv>\n") if compress else b"</tv>\n"
+    logger.info(f"Exported XMLTV for {len(channels)} channels over {len(days)} days")
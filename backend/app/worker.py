@@ -1,19 +1,299 @@
+import asyncio
 import logging
 import os
 import sys
-from rq import Worker, Queue, Connection
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Dict, List, Optional, Tuple, TypeVar
+from prometheus_client import start_http_server
+from rq import Worker, SimpleWorker, Queue, Retry
+from rq.job import Dependency
 import redis
 
 # Add the app directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.core.config import settings
+from app.core.database import SessionLocal, AsyncSessionLocal
 from app.core.logging import setup_logging
+from app.services.guide_tiles import affected_tiles, drop_lineup_tiles, rebuild_tiles
+from app.services.ingest import ingest_user_schedules
+from app.services.ingest_runs import (
+    STAGE_LINEUPS, create_run, get_current_run, is_stale, unfinished_shards, set_shard_job,
+    run_lineups_stage, run_schedule_shard, run_programs_stage, run_images_stage, finish_run
+)
+from app.services.mailer import send_digests, close_mailer
+from app.services.notifications import record_rule_matches, dispatch_digests, next_retry_at
+from app.services.partitions import maintain_schedule_partitions
+from app.services.rules import find_rule_matches
+from app.services.schedules_direct import close_sd_client
+from app.services.suggest import refresh_suggest_index
+from app.services.versions import bump_versions, bump_user_versions
+from app.services.xmltv import rebuild_fragments, prune_fragments
 
 # Setup logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+def get_queue(name: str) -> Queue:
+    """Get an RQ queue by name"""
+    return Queue(name, connection=redis.from_url(settings.REDIS_URL))
+
+# One loop per process so the shared SD client's pooled connections outlive a single job
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run a coroutine on the worker process's persistent event loop"""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
+def enqueue_ingest_followups(stats: Dict[str, Any]):
+    """Queue the derived-data jobs for whatever an ingest changed"""
+    queue = get_queue('default')
+    if stats["changed_station_days"]:
+        queue.enqueue(evaluate_rules, stats["changed_station_days"])
+        queue.enqueue(rebuild_xmltv_fragments, stats["changed_station_days"])
+    if stats["fetched_program_ids"]:
+        queue.enqueue(rebuild_suggest_index, stats["fetched_program_ids"])
+    if stats["changed_station_days"] or stats["changed_lineups"]:
+        queue.enqueue(rebuild_guide_tiles, stats["changed_station_days"], stats["changed_lineups"])
+
+def ingest_schedules(user_id: str, days: int = 14) -> Dict[str, Any]:
+    """Incrementally refresh schedules for a user's lineups (ingest queue)"""
+    db = SessionLocal()
+    try:
+        stats = run_async(ingest_user_schedules(db, user_id, days))
+        logger.info(
+            f"Ingest for user {user_id} finished: {stats['station_days_changed']} station-days changed, "
+            f"{stats['programs_fetched']} programs fetched, {stats['programs_skipped']} skipped"
+        )
+        
+        enqueue_ingest_followups(stats)
+        return stats
+    finally:
+        db.close()
+
+# Present while a planned ingest chain is alive, so restarts don't start a second one
+PLANNED_INGEST_KEY = "worker:planned-ingest"
+
+# Shard and stage jobs survive a crashed or redeployed worker; retries resume from the checkpoint
+INGEST_RETRY = Retry(max=3, interval=[60, 300, 900])
+
+def ingest_all(days: int = 14) -> Optional[str]:
+    """Start a sharded full refresh, or resume a stalled one, then reschedule (ingest queue)"""
+    interval = settings.INGEST_INTERVAL_SECONDS
+    queue = get_queue('ingest')
+    try:
+        run = get_current_run()
+        if run is None:
+            run_id = create_run(days)
+            queue.enqueue(ingest_run_lineups, run_id, job_timeout=3600, retry=INGEST_RETRY)
+            return run_id
+        if is_stale(run):
+            logger.warning(f"Ingest run {run['run_id']} stalled in {run['stage']}, resuming")
+            if run["stage"] == STAGE_LINEUPS:
+                queue.enqueue(ingest_run_lineups, run["run_id"], job_timeout=3600, retry=INGEST_RETRY)
+            else:
+                enqueue_ingest_stages(run["run_id"], unfinished_shards(run["run_id"]))
+        else:
+            logger.info(f"Ingest run {run['run_id']} still in progress ({run['stage']})")
+        return run["run_id"]
+    finally:
+        # Rescheduled even after a failure so one bad run doesn't stop refreshes
+        if interval:
+            queue.connection.set(PLANNED_INGEST_KEY, 1, ex=interval * 2)
+            queue.enqueue_in(timedelta(seconds=interval), ingest_all, days)
+
+def enqueue_ingest_stages(run_id: str, shards: List[int]):
+    """Queue schedule shards, then programs -> images -> finish once every shard has run"""
+    queue = get_queue('ingest')
+    jobs = []
+    for shard in shards:
+        job = queue.enqueue(ingest_run_shard, run_id, shard, job_timeout=3600, retry=INGEST_RETRY)
+        set_shard_job(run_id, shard, job.id)
+        jobs.append(job)
+    
+    # A shard that fails for good shouldn't hold back the rest; its unfinished batches recorded no
+    # schedule MD5s, so the next run refetches those station-days
+    programs = queue.enqueue(
+        ingest_run_programs, run_id,
+        depends_on=Dependency(jobs=jobs, allow_failure=True) if jobs else None,
+        job_timeout=3600, retry=INGEST_RETRY
+    )
+    images = queue.enqueue(ingest_run_images, run_id, depends_on=programs, job_timeout=3600, retry=INGEST_RETRY)
+    queue.enqueue(ingest_run_finish, run_id, depends_on=images)
+
+def ingest_run_lineups(run_id: str) -> int:
+    """Refresh lineups once across all users and fan out schedule shards (ingest queue)"""
+    db = SessionLocal()
+    try:
+        shards = run_async(run_lineups_stage(db, run_id))
+    finally:
+        db.close()
+    
+    enqueue_ingest_stages(run_id, list(range(shards)))
+    return shards
+
+def ingest_run_shard(run_id: str, shard: int) -> Dict[str, Any]:
+    """Fetch one shard of a run's schedules (ingest queue)"""
+    db = SessionLocal()
+    try:
+        return run_async(run_schedule_shard(db, run_id, shard))
+    finally:
+        db.close()
+
+def ingest_run_programs(run_id: str) -> Dict[str, Any]:
+    """Fetch programs changed across a run's shards (ingest queue)"""
+    db = SessionLocal()
+    try:
+        return run_async(run_programs_stage(db, run_id))
+    finally:
+        db.close()
+
+def ingest_run_images(run_id: str) -> Dict[str, Any]:
+    """Fetch artwork for a run's new programs (ingest queue)"""
+    db = SessionLocal()
+    try:
+        return run_async(run_images_stage(db, run_id))
+    finally:
+        db.close()
+
+def ingest_run_finish(run_id: str) -> Dict[str, Any]:
+    """Close a run and queue rule evaluation and the other derived-data jobs (ingest queue)"""
+    stats = finish_run(run_id)
+    enqueue_ingest_followups(stats)
+    return {"changed_station_days": len(stats["changed_station_days"]), "failed_shards": stats["failed_shards"]}
+
+def rebuild_guide_tiles(station_days: List[Tuple[str, str]], changed_lineups: Optional[List[str]] = None) -> int:
+    """Rebuild cached guide tiles affected by an ingest, then bump content versions (default queue)"""
+    changed_lineups = changed_lineups or []
+    db = SessionLocal()
+    try:
+        tiles = [tile for tile in affected_tiles(db, station_days) if tile[0] not in changed_lineups]
+    finally:
+        db.close()
+    
+    async def rebuild() -> int:
+        await drop_lineup_tiles(changed_lineups)
+        async with AsyncSessionLocal() as async_db:
+            return await rebuild_tiles(async_db, tiles)
+    
+    rebuilt = run_async(rebuild())
+    
+    # Only after the tiles are current, so a new ETag never labels a stale grid
+    bump_versions(
+        lineup_ids={lineup_id for lineup_id, _ in tiles} | set(changed_lineups),
+        station_ids={station_id for station_id, _ in station_days}
+    )
+    return rebuilt
+
+def rebuild_xmltv_fragments(station_days: List[Tuple[str, str]]) -> int:
+    """Regenerate stored XMLTV fragments for changed station-days (default queue)"""
+    db = SessionLocal()
+    try:
+        return rebuild_fragments(db, station_days)
+    finally:
+        db.close()
+
+# Present while a digest dispatch is scheduled, so a burst of matches shares one run
+NOTIFY_DISPATCH_KEY = "worker:notify-dispatch"
+
+def evaluate_rules(station_days: List[Tuple[str, str]]) -> int:
+    """Match every active rule against airings in changed station-days and record them as notifications (default queue)"""
+    # Recorded here rather than passed on to another job, so the match list never travels through Redis
+    db = SessionLocal()
+    try:
+        matches = find_rule_matches(db, station_days)
+        users = record_rule_matches(db, matches) if matches else set()
+    finally:
+        db.close()
+    
+    # New matches change these users' calendar feeds
+    bump_user_versions(users)
+    
+    delay = settings.NOTIFY_DIGEST_DELAY_SECONDS
+    queue = get_queue('notify')
+    if users and queue.connection.set(NOTIFY_DISPATCH_KEY, 1, nx=True, ex=delay * 2):
+        queue.enqueue_in(timedelta(seconds=delay), dispatch_notifications)
+    return len(matches)
+
+def dispatch_notifications() -> Dict[str, int]:
+    """Coalesce pending notifications into per-user digests (notify queue)"""
+    # Cleared first: matches recorded from now on schedule the next run
+    get_queue('notify').connection.delete(NOTIFY_DISPATCH_KEY)
+    
+    stats = {"digests": 0, "notifications": 0, "claimed": 0, "retry": 0}
+    if not settings.EMAIL_SMTP_URI:
+        # Leave notifications pending rather than spend their attempts with no way to send them
+        logger.warning("EMAIL_SMTP_URI is not set; not dispatching notification digests")
+        return stats
+    db = SessionLocal()
+    try:
+        while True:
+            digests, claimed, retry = dispatch_digests(db, deliver=send_digests)
+            stats["claimed"] += claimed
+            stats["digests"] += len(digests)
+            stats["notifications"] += sum(len(digest["items"]) for digest in digests)
+            stats["retry"] += retry
+            # Retried rows are backed off, so the next batch is always new work
+            if claimed < settings.NOTIFY_BATCH_SIZE:
+                break
+        retry_at = next_retry_at(db)
+    finally:
+        db.close()
+    
+    # Come back when the earliest backed-off notification is due
+    if retry_at is not None:
+        delay = max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0) + 1
+        queue = get_queue('notify')
+        if queue.connection.set(NOTIFY_DISPATCH_KEY, 1, nx=True, ex=int(delay) + settings.NOTIFY_DIGEST_DELAY_SECONDS):
+            queue.enqueue_in(timedelta(seconds=delay), dispatch_notifications)
+    return stats
+
+# Held while a suggestion index build runs; builds read-modify-write the published snapshot
+SUGGEST_LOCK_KEY = "worker:suggest-index"
+
+def rebuild_suggest_index(program_ids: Optional[List[str]] = None) -> Optional[str]:
+    """Fold changed programs into the search suggestion index (default queue)"""
+    queue = get_queue('default')
+    if not queue.connection.set(SUGGEST_LOCK_KEY, 1, nx=True, ex=1800):
+        # Another build is running; retry shortly rather than lose this one's changes
+        queue.enqueue_in(timedelta(seconds=30), rebuild_suggest_index, program_ids)
+        return None
+    
+    db = SessionLocal()
+    try:
+        return refresh_suggest_index(db, program_ids)
+    finally:
+        db.close()
+        queue.connection.delete(SUGGEST_LOCK_KEY)
+
+# Present while a maintenance chain is alive, so restarts don't start a second one
+PARTITION_MAINTENANCE_KEY = "worker:partition-maintenance"
+
+def maintain_partitions() -> Dict[str, Any]:
+    """Create upcoming schedule partitions and drop expired ones, then reschedule (default queue)"""
+    db = SessionLocal()
+    try:
+        result = maintain_schedule_partitions(db)
+    finally:
+        db.close()
+    result["fragments_pruned"] = prune_fragments(settings.SCHEDULE_RETENTION_DAYS)
+    
+    interval = settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS
+    queue = get_queue('default')
+    queue.connection.set(PARTITION_MAINTENANCE_KEY, 1, ex=interval * 2)
+    queue.enqueue_in(timedelta(seconds=interval), maintain_partitions)
+    return result
+
+def enqueue_ingest(user_id: str, days: int = 14):
+    """Enqueue an incremental schedule ingest for a user"""
+    return get_queue('ingest').enqueue(ingest_schedules, user_id, days, job_timeout=3600)
+
 def main():
     """Run RQ worker"""
     # Connect to Redis
@@ -27,10 +307,29 @@ def main():
         Queue('default', connection=redis_conn),
     ]
     
-    # Start worker
-    logger.info("Starting RQ worker...")
-    worker = Worker(queues, connection=redis_conn)
-    worker.work()
+    # Start worker; in-process jobs share one SD client across jobs
+    worker_class = Worker if settings.WORKER_FORK_JOBS else SimpleWorker
+    logger.info(f"Starting RQ worker ({worker_class.__name__})...")
+    worker = worker_class(queues, connection=redis_conn)
+    
+    if settings.WORKER_METRICS_PORT:
+        start_http_server(settings.WORKER_METRICS_PORT)
+    
+    # Start partition maintenance unless a chain is already running; each run schedules the next
+    if redis_conn.set(PARTITION_MAINTENANCE_KEY, 1, nx=True, ex=settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS * 2):
+        queues[-1].enqueue(maintain_partitions)
+    
+    # Likewise for the fleet-wide ingest
+    if settings.INGEST_INTERVAL_SECONDS and redis_conn.set(
+        PLANNED_INGEST_KEY, 1, nx=True, ex=settings.INGEST_INTERVAL_SECONDS * 2
+    ):
+        queues[0].enqueue(ingest_all)
+    
+    try:
+        worker.work(with_scheduler=True)
+    finally:
+        run_async(close_sd_client())
+        close_mailer()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
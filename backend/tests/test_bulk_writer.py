@@ -0,0 +1,76 @@
+import re
+import uuid
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import Boolean, DateTime, Integer, JSON, String
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.services.bulk_writer import _copy_array, _copy_field
+
+COPY_ESCAPES = {"\\": "\\", "t": "\t", "n": "\n", "r": "\r", "b": "\b", "f": "\f", "v": "\v"}
+
+def _parse_copy_line(line):
+    """Decode one line of COPY text format the way PostgreSQL does"""
+    assert "\n" not in line and "\r" not in line
+    fields = []
+    for raw in line.split("\t"):
+        if raw == "\\N":
+            fields.append(None)
+            continue
+        fields.append(re.sub(r"\\(.)", lambda match: COPY_ESCAPES.get(match.group(1), match.group(1)), raw))
+    return fields
+
+NASTY = [
+    "plain",
+    "tab\there",
+    "new\nline",
+    "carriage\rreturn",
+    "back\\slash",
+    "trailing backslash\\",
+    "\\N",
+    "\\t literal",
+    "quote \" and {brace}, comma",
+    "",
+    "ünïcødé ☃",
+]
+
+@pytest.mark.parametrize("value", NASTY)
+def test_text_fields_round_trip(value):
+    encoded = _copy_field(value, String())
+    assert _parse_copy_line(encoded) == [value]
+
+def test_row_of_fields_keeps_its_columns():
+    encoded = "\t".join(_copy_field(value, String()) for value in NASTY)
+    assert _parse_copy_line(encoded) == NASTY
+
+def test_null_and_scalars():
+    assert _copy_field(None, String()) == "\\N"
+    assert _copy_field(None, ARRAY(String())) == "\\N"
+    assert _copy_field(True, Boolean()) == "t"
+    assert _copy_field(False, Boolean()) == "f"
+    assert _copy_field(0, Integer()) == "0"
+    assert _copy_field(uuid.UUID(int=1), String()) == "00000000-0000-0000-0000-000000000001"
+
+def test_dates_use_iso_format():
+    moment = datetime(2025, 10, 18, 20, 30, tzinfo=timezone.utc)
+    assert _copy_field(moment, DateTime(timezone=True)) == "2025-10-18T20:30:00+00:00"
+    assert _copy_field(date(2025, 10, 18), None) == "2025-10-18"
+
+def test_json_is_serialized_then_escaped():
+    value = {"text": "line\nbreak\tand \\ slash", "n": [1, None]}
+    encoded = _copy_field(value, JSON())
+    assert "\n" not in encoded and "\t" not in encoded
+    assert _parse_copy_line(encoded) == ['{"text": "line\\nbreak\\tand \\\\ slash", "n": [1, null]}']
+
+def test_array_literal_quotes_and_escapes_elements():
+    assert _copy_array([]) == "{}"
+    assert _copy_array(["a", None, 3]) == '{"a",NULL,"3"}'
+    assert _copy_array(['say "hi"', "back\\slash", "NULL", "a,b}"]) == (
+        '{"say \\"hi\\"","back\\\\slash","NULL","a,b}"}'
+    )
+
+def test_array_field_escapes_for_copy_after_array_quoting():
+    encoded = _copy_field(["tab\there", "back\\slash"], ARRAY(String()))
+    # COPY decoding yields the array literal; array parsing then yields the elements
+    assert _parse_copy_line(encoded) == ['{"tab\there","back\\\\slash"}']
@@ -0,0 +1,68 @@
+import random
+
+from app.services.ingest_planner import assign_fetches, plan_station_shards
+
+def _check_plan(plan, coverage, needed):
+    """Every coverable item is assigned exactly once, to an account that can fetch it"""
+    assigned = [item for items in plan.values() for item in items]
+    assert len(assigned) == len(set(assigned))
+    coverable = needed & set().union(*coverage.values()) if coverage else set()
+    assert set(assigned) == coverable
+    for user_id, items in plan.items():
+        assert items <= coverage[user_id]
+
+def test_assign_fetches_picks_largest_cover_first():
+    coverage = {"a": {1, 2}, "b": {3, 4}, "c": {1, 2, 3, 4}}
+    assert assign_fetches(coverage, {1, 2, 3, 4}) == {"c": {1, 2, 3, 4}}
+
+def test_assign_fetches_breaks_ties_by_preference_then_id():
+    coverage = {"a": {1, 2}, "b": {1, 2}, "c": {1, 2}}
+    assert assign_fetches(coverage, {1, 2}) == {"a": {1, 2}}
+    assert assign_fetches(coverage, {1, 2}, preferred={"c"}) == {"c": {1, 2}}
+
+def test_assign_fetches_recomputes_stale_gains():
+    # "b" looks best up front but loses most of its items to "a"
+    coverage = {"a": {1, 2, 3, 4, 5}, "b": {1, 2, 3, 4, 6}, "c": {6, 7}}
+    plan = assign_fetches(coverage, set(range(1, 8)))
+    assert plan == {"a": {1, 2, 3, 4, 5}, "c": {6, 7}}
+
+def test_assign_fetches_skips_uncoverable_items():
+    coverage = {"a": {1}}
+    assert assign_fetches(coverage, {1, 2}) == {"a": {1}}
+    assert assign_fetches({}, {1}) == {}
+    assert assign_fetches(coverage, set()) == {}
+
+def test_assign_fetches_does_not_mutate_inputs():
+    coverage = {"a": {1, 2}, "b": {2, 3}}
+    needed = {1, 2, 3}
+    assign_fetches(coverage, needed)
+    assert coverage == {"a": {1, 2}, "b": {2, 3}}
+    assert needed == {1, 2, 3}
+
+def test_assign_fetches_matches_eager_greedy():
+    rng = random.Random(7)
+    for _ in range(200):
+        users = [f"u{i}" for i in range(rng.randint(1, 8))]
+        coverage = {user: set(rng.sample(range(30), rng.randint(0, 12))) for user in users}
+        needed = set(rng.sample(range(35), rng.randint(0, 25)))
+        preferred = set(rng.sample(users, rng.randint(0, len(users))))
+
+        plan = assign_fetches(coverage, needed, preferred)
+        _check_plan(plan, coverage, needed)
+
+        # Reference: recompute every gain each round
+        expected = {}
+        remaining = set(needed)
+        candidates = dict(coverage)
+        while remaining:
+            best = min(candidates, key=lambda u: (-len(candidates[u] & remaining), u not in preferred, u), default=None)
+            if best is None or not candidates[best] & remaining:
+                break
+            expected[best] = candidates.pop(best) & remaining
+            remaining -= expected[best]
+        assert plan == expected
+
+def test_plan_station_shards_splits_and_skips_failed_accounts():
+    coverage = {"a": {"s1", "s2", "s3"}, "b": {"s3", "s4"}, "c": {"s1", "s2", "s3", "s4", "s5"}}
+    shards = plan_station_shards(coverage, preferred=set(), failed={"c"}, shard_size=2)
+    assert shards == [("a", ["s1", "s2"]), ("a", ["s3"]), ("b", ["s4"])]
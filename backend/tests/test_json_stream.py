@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from app.services.schedules_direct import JSONArrayStreamParser
+
+ITEMS = [
+    {"programID": "EP000000010001", "title": "Tab\there, \"quoted\" and \\backslash\\"},
+    {"programID": "EP000000010002", "descriptions": {"en": ["Line one\nline two", "]}, not the end"]}},
+    {"programID": "SH000000020000", "title": "Unicode é☃ 📺", "md5": "abc"},
+    [1, [2, [3]], {"nested": []}],
+    "a plain string with , and ] inside",
+    12345,
+    -0.5e3,
+    True,
+    None,
+]
+
+def _parse(chunks):
+    parser = JSONArrayStreamParser()
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    items.extend(parser.close())
+    return items
+
+def _split(text, size):
+    return [text[offset:offset + size] for offset in range(0, len(text), size)]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_items_survive_any_chunking(size):
+    text = json.dumps(ITEMS, indent=1)
+    assert _parse(_split(text, size)) == ITEMS
+
+def test_every_split_point():
+    # A chunk boundary inside a string, an escape or a number must never change the result
+    text = json.dumps(ITEMS)
+    for cut in range(len(text) + 1):
+        assert _parse([text[:cut], text[cut:]]) == ITEMS, cut
+
+def test_number_at_chunk_edge_is_not_cut_short():
+    parser = JSONArrayStreamParser()
+    assert parser.feed("[12") == []
+    assert parser.feed("34, 5") == [1234]
+    assert parser.feed("6]") == [56]
+    assert parser.close() == []
+
+def test_number_cut_inside_fraction_or_exponent():
+    for head, tail in [("[-500.", "25]"), ("[1e", "3]"), ("[1e+", "3]"), ("[0", ".5]"), ("[7", "]")]:
+        parser = JSONArrayStreamParser()
+        items = parser.feed(head) + parser.feed(tail) + parser.close()
+        assert items == json.loads(head + tail)
+
+def test_complete_items_are_not_held_back_by_a_partial_one():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(': 2}]') + parser.close() == [{"b": 2}]
+
+def test_empty_array_and_whitespace():
+    assert _parse([" \n[", " ", "]\n"]) == []
+    assert _parse([]) == []
+
+def test_top_level_object_is_returned_whole():
+    error = {"response": "INVALID_USER", "code": 4003, "message": "bad [token]"}
+    assert _parse(_split(json.dumps(error), 5)) == [error]
+
+def test_truncated_array_raises():
+    with pytest.raises(ValueError):
+        _parse(['[{"a": 1}, {"b": '])
+    with pytest.raises(ValueError):
+        _parse(['[{"a": 1}'])
@@ -0,0 +1,67 @@
+import random
+from collections import Counter
+
+from app.services.rules import WordAutomaton
+
+def _automaton(phrases):
+    automaton = WordAutomaton()
+    for value, phrase in phrases.items():
+        automaton.add(phrase.split(), value)
+    automaton.build()
+    return automaton
+
+def _naive(phrases, text):
+    words = text.split()
+    found = []
+    for value, phrase in phrases.items():
+        pattern = phrase.split()
+        found += [value] * sum(
+            words[start:start + len(pattern)] == pattern for start in range(len(words) - len(pattern) + 1)
+        )
+    return Counter(found)
+
+def test_matches_whole_words_only():
+    automaton = _automaton({"cup": "world cup"})
+    assert automaton.search("the world cup final".split()) == ["cup"]
+    assert automaton.search("world cupcake".split()) == []
+    assert automaton.search("cup world".split()) == []
+
+def test_overlapping_and_nested_phrases():
+    phrases = {"he": "she", "she": "he she", "hers": "he she hers", "his": "his", "x": "she hers"}
+    automaton = _automaton(phrases)
+    text = "he she hers his"
+    assert Counter(automaton.search(text.split())) == _naive(phrases, text)
+    assert Counter(automaton.search(text.split())) == Counter({"he": 1, "she": 1, "hers": 1, "x": 1, "his": 1})
+
+def test_failure_links_follow_partial_matches():
+    # After "a a" the automaton must fall back to the "a" prefix, not the root
+    automaton = _automaton({"aab": "a a b"})
+    assert automaton.search("a a a b".split()) == ["aab"]
+
+def test_shared_phrase_reports_every_value():
+    automaton = WordAutomaton()
+    automaton.add(["news"], "rule-1")
+    automaton.add(["news"], "rule-2")
+    automaton.build()
+    assert sorted(automaton.search(["evening", "news"])) == ["rule-1", "rule-2"]
+
+def test_repeated_occurrences_are_all_reported():
+    automaton = _automaton({"go": "go go"})
+    assert automaton.search("go go go".split()) == ["go", "go"]
+
+def test_empty_automaton_and_text():
+    empty = WordAutomaton()
+    empty.build()
+    assert empty.search("anything at all".split()) == []
+    assert _automaton({"a": "a"}).search([]) == []
+
+def test_matches_naive_search():
+    rng = random.Random(11)
+    vocabulary = ["a", "b", "c", "d"]
+    for _ in range(300):
+        phrases = {
+            index: " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4)))
+            for index in range(rng.randint(1, 8))
+        }
+        text = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 20)))
+        assert Counter(_automaton(phrases).search(text.split())) == _naive(phrases, text)
@@ -0,0 +1,76 @@
+import pytest
+
+from app.services.suggest import (
+    KIND_PERSON, KIND_SERIES, KIND_TITLE, MAX_SUGGESTIONS, SuggestIndex, encode_snapshot, normalize
+)
+
+ENTRIES = {
+    ("The Office", KIND_SERIES): 900,
+    ("Office Space", KIND_TITLE): 40,
+    ("Amélie", KIND_TITLE): 12,
+    ("Oprah Winfrey", KIND_PERSON): 300,
+    ("Off the Air", KIND_SERIES): 55,
+    ("A Team", KIND_SERIES): 70,
+    ("日本のテレビ", KIND_TITLE): 3,
+}
+
+def _index(entries):
+    return SuggestIndex(encode_snapshot(entries))
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert normalize("Amélie!") == "amelie"
+    assert normalize("  Law & Order: SVU ") == "law order svu"
+
+def test_round_trip_preserves_every_entry():
+    assert _index(ENTRIES).entries() == ENTRIES
+
+def test_round_trip_through_memoryview():
+    # Served from an mmap, so slicing must work on a buffer, not just bytes
+    index = SuggestIndex(memoryview(encode_snapshot(ENTRIES)))
+    assert index.entries() == ENTRIES
+
+def test_empty_snapshot():
+    index = _index({})
+    assert index.entries() == {}
+    assert index.suggest("a") == []
+    assert index.suggest("anything long") == []
+
+def test_rejects_foreign_data():
+    with pytest.raises(ValueError):
+        SuggestIndex(b"NOTANIDX" + bytes(8))
+
+def test_short_prefixes_are_ranked_by_weight():
+    texts = [suggestion["text"] for suggestion in _index(ENTRIES).suggest("o")]
+    assert texts == ["The Office", "Oprah Winfrey", "Off the Air", "Office Space"]
+
+def test_long_prefixes_scan_the_key_range():
+    index = _index(ENTRIES)
+    assert [s["text"] for s in index.suggest("offic")] == ["The Office", "Office Space"]
+    assert index.suggest("officez") == []
+    assert index.suggest("zzzz") == []
+
+def test_leading_article_is_optional_and_deduplicated():
+    index = _index(ENTRIES)
+    assert index.suggest("the off") == [{"text": "The Office", "kind": "series"}]
+    assert [s["text"] for s in index.suggest("off")].count("The Office") == 1
+    assert [s["text"] for s in index.suggest("tea")] == ["A Team"]
+
+def test_query_is_normalized_like_keys():
+    assert _index(ENTRIES).suggest("AMÉL") == [{"text": "Amélie", "kind": "title"}]
+
+def test_limit_and_head_size():
+    entries = {(f"Show {i:03d}", KIND_SERIES): i for i in range(100)}
+    index = _index(entries)
+    assert len(index.suggest("s", limit=5)) == 5
+    top = index.suggest("sho", limit=100)
+    assert len(top) == MAX_SUGGESTIONS
+    assert top[0]["text"] == "Show 099"
+
+def test_entries_without_a_key_are_kept_out_of_the_index():
+    entries = {("!!!", KIND_TITLE): 5, ("Real", KIND_TITLE): 1}
+    assert _index(entries).entries() == {("Real", KIND_TITLE): 1}
+
+def test_non_latin_titles_are_indexed():
+    index = _index({**ENTRIES, ("Доктор Хаус", KIND_SERIES): 20})
+    assert index.suggest("докт") == [{"text": "Доктор Хаус", "kind": "series"}]
+    assert index.suggest("日本") == [{"text": "日本のテレビ", "kind": "title"}]